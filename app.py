@@ -3,23 +3,42 @@ OpenAI 120B Advanced - Interface avec capacités de développement complètes
 Version avec génération et exécution de code en temps réel
 """
 
+import time
+
+SCRIPT_START = time.perf_counter()
+
 import os
+import queue
+import threading
+import uuid
 import streamlit as st
-from openai import OpenAI
 from dotenv import load_dotenv
-import time
-import json
-import datetime
 from pathlib import Path
-import subprocess
-import tempfile
-import sys
-import io
-import contextlib
-import traceback
-import zipfile
-import base64
-import re
+import shutil
+
+from lazy_imports import lazy_import, prewarm, import_profile
+from executor import KernelManager, WorkerPool
+from scheduler import ExecutionScheduler
+from execution_cache import ExecutionCache, environment_fingerprint, run_cached
+from response_cache import ResponseCache, make_cache_key
+from usage_ledger import UsageLedger
+from conversation_store import ConversationStore
+from context_builder import build_context
+from project_catalog import ProjectCatalog
+from project_stream import ProjectStreamParser
+from assistant_core import (
+    DEFAULT_BASE_URL, DEFAULT_ENDPOINTS, DEFAULT_MODEL, build_router, create_advanced_prompt,
+    extract_code_blocks, extract_json_from_text, new_project_dir, parse_endpoints,
+    write_project, write_project_file,
+)
+from telemetry import Telemetry
+from token_counter import count_source, count_tokens, count_message_tokens, usage_to_dict
+
+# Modules lourds chargés à la première utilisation
+openai = lazy_import("openai")
+model_router = lazy_import("model_router")
+project_archive = lazy_import("project_archive")
+similarity_cache = lazy_import("similarity_cache")
 
 # Configuration de la page
 st.set_page_config(
@@ -127,327 +146,432 @@ st.markdown("""
 
 # Fonctions utilitaires avancées
 CONVERSATIONS_DIR = Path("conversations")
+OWNER_PARAM = "u"  # paramètre d'URL du jeton anonyme: conversations retrouvées après rechargement
 PROJECTS_DIR = Path("generated_projects")
 CONVERSATIONS_DIR.mkdir(exist_ok=True)
+HISTORY_PAGE_SIZE = 20  # messages chargés par page à la réouverture d'une conversation
+HISTORY_WINDOW = 10  # messages affichés à chaque rerun (les plus récents)
 PROJECTS_DIR.mkdir(exist_ok=True)
-CREDITS_FILE = Path("credits_usage.json")
+CREDITS_FILE = Path("credits_usage.json")  # ancien format, importé dans le registre
+LEDGER_FILE = Path("usage_ledger.db")
+CATALOG_FILE = Path("projects_catalog.db")  # hors de PROJECTS_DIR pour ne pas modifier son mtime
+PROJECTS_PAGE_SIZE = 3
+CACHE_FILE = Path("response_cache.db")
+SIMILARITY_FILE = Path("similarity_index.db")
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", 0.8))  # similarité cosinus minimale (calibrée sur des reformulations)
+SIMILARITY_MAX_ENTRIES = int(os.environ.get("SIMILARITY_MAX_ENTRIES", 500))  # prompts indexés par mode
+EXECUTION_WORKERS = int(os.environ.get("EXECUTION_WORKERS", 4))
+EXECUTION_TIMEOUT = float(os.environ.get("EXECUTION_TIMEOUT", 30))  # secondes (horloge)
+EXECUTION_CPU_TIMEOUT = int(os.environ.get("EXECUTION_CPU_TIMEOUT", 20))  # secondes CPU
+# Ordonnancement équitable des exécutions entre sessions (workers et kernels confondus)
+EXECUTION_MAX_CONCURRENT = int(os.environ.get("EXECUTION_MAX_CONCURRENT", EXECUTION_WORKERS))
+SESSION_CPU_QUOTA = float(os.environ.get("SESSION_CPU_QUOTA", 120))  # secondes CPU par fenêtre
+SESSION_QUOTA_WINDOW = float(os.environ.get("SESSION_QUOTA_WINDOW", 600))  # secondes
+SESSION_MEMORY_QUOTA_MB = int(os.environ.get("SESSION_MEMORY_QUOTA_MB", 1024))  # croissance de la mémoire résidente par exécution
+EXECUTION_CACHE_ENTRIES = int(os.environ.get("EXECUTION_CACHE_ENTRIES", 512))
+EXECUTION_CACHE_MB = int(os.environ.get("EXECUTION_CACHE_MB", 32))
+# Figures matplotlib des exécutions: encodées une fois dans le worker (png ou webp, réduites via Pillow)
+FIGURE_OPTIONS = {
+    "image_format": os.environ.get("FIGURE_FORMAT", "webp"),
+    "dpi": int(os.environ.get("FIGURE_DPI", 100)),
+    "max_size": int(os.environ.get("FIGURE_MAX_SIZE", 1280)),  # pixels, plus grand côté
+    "max_figures": int(os.environ.get("FIGURE_MAX_COUNT", 8)),
+}
+# Kernels persistants: un worker par conversation, namespace conservé entre les tours
+KERNEL_MAX = int(os.environ.get("KERNEL_MAX", 8))
+KERNEL_IDLE_TIMEOUT = float(os.environ.get("KERNEL_IDLE_TIMEOUT", 900))  # secondes
+KERNEL_MAX_MEMORY_MB = int(os.environ.get("KERNEL_MAX_MEMORY_MB", 1024))
+FIGURE_CACHE_ENTRIES = 64  # figures relues depuis le disque gardées en mémoire
+LIVE_OUTPUT_CHARS = 4000  # fin de sortie affichée pendant l'exécution
+RERUN_BUDGET_MS = float(os.environ.get("RERUN_BUDGET_MS", 300))  # budget par rerun
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", DEFAULT_BASE_URL)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))  # requêtes simultanées (toutes sessions)
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 180))  # secondes par requête, retries compris
+LLM_MODEL = DEFAULT_MODEL
+# Endpoints candidats: liste de modèles séparés par des virgules, ou JSON
+# [{"name": ..., "model": ..., "base_url": ..., "api_key_env": ...}]
+LLM_ENDPOINTS = os.environ.get("LLM_ENDPOINTS", DEFAULT_ENDPOINTS)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))  # endpoint Prometheus /metrics (0 = désactivé)
+TRACE_LOG = os.environ.get("TRACE_LOG")  # fichier JSONL des traces par tour (optionnel)
 
-def load_credits_usage():
-    if CREDITS_FILE.exists():
-        try:
-            with open(CREDITS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {"total_tokens": 0, "total_requests": 0, "sessions": [], "projects_created": 0}
+def stream_completion(router, mode, placeholder, render_interval=0.1, on_delta=None, on_restart=None, **request_kwargs):
+    """Génère une réponse en streaming avec rendu throttlé dans le placeholder"""
+    start_time = time.time()
+    first_token_time = None
+    last_render = 0.0
+    chunks = []
+    chunk_count = 0
+    usage = None
 
-def save_credits_usage(credits_data):
     try:
-        with open(CREDITS_FILE, 'w') as f:
-            json.dump(credits_data, f, indent=2)
-    except Exception as e:
-        st.warning(f"Impossible de sauvegarder les stats: {e}")
+        # Demander l'usage réel dans le dernier chunk
+        stream = router.stream(mode, stream_options={"include_usage": True}, **request_kwargs)
+    except openai.BadRequestError:
+        # Provider qui ne supporte pas stream_options
+        stream = router.stream(mode, **request_kwargs)
+    for chunk in stream:
+        if isinstance(chunk, model_router.FailoverRestart):
+            # Endpoint tombé en cours de génération: on repart de zéro sur le suivant
+            chunks = []
+            chunk_count = 0
+            first_token_time = None
+            usage = None
+            placeholder.markdown(f"🔄 Bascule vers `{chunk.endpoint}`...")
+            if on_restart is not None:
+                on_restart()
+            continue
+        
+        # Certains providers envoient l'usage dans le dernier chunk
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
 
-def estimate_tokens(text):
-    return int(len(text.split()) * 1.3)
+        if first_token_time is None:
+            first_token_time = time.time()
+        chunks.append(delta)
+        chunk_count += 1
+        if on_delta is not None:
+            on_delta(delta)
 
-def execute_python_code(code):
-    """Exécute du code Python en toute sécurité"""
-    try:
-        # Nettoyer le code
-        code = code.strip()
-        if not code:
-            return {"success": False, "output": "", "error": "Code vide"}
-        
-        # Capturer stdout et stderr
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        
-        captured_output = io.StringIO()
-        captured_error = io.StringIO()
-        
-        sys.stdout = captured_output
-        sys.stderr = captured_error
-        
-        # Créer un namespace sécurisé avec plus de modules
-        safe_globals = {
-            '__builtins__': {
-                'print': print,
-                'len': len,
-                'range': range,
-                'list': list,
-                'dict': dict,
-                'str': str,
-                'int': int,
-                'float': float,
-                'bool': bool,
-                'sum': sum,
-                'max': max,
-                'min': min,
-                'sorted': sorted,
-                'enumerate': enumerate,
-                'zip': zip,
-                'map': map,
-                'filter': filter,
-                'abs': abs,
-                'round': round,
-                'type': type,
-                'isinstance': isinstance,
-            }
-        }
-        
-        # Ajouter des modules utiles
-        try:
-            safe_globals['math'] = __import__('math')
-            safe_globals['datetime'] = __import__('datetime')
-            safe_globals['json'] = __import__('json')
-            safe_globals['random'] = __import__('random')
-            safe_globals['time'] = __import__('time')
-            safe_globals['re'] = __import__('re')
-        except:
-            pass
-        
-        # Essayer d'importer des modules de data science
-        try:
-            import matplotlib
-            matplotlib.use('Agg')  # Backend non-interactif
-            import matplotlib.pyplot as plt
-            safe_globals['plt'] = plt
-            safe_globals['matplotlib'] = matplotlib
-        except:
-            pass
-            
-        try:
-            import numpy as np
-            safe_globals['np'] = np
-            safe_globals['numpy'] = np
-        except:
-            pass
-            
+        # Limiter les re-rendus Streamlit (pas un redraw par token)
+        now = time.time()
+        if now - last_render >= render_interval:
+            placeholder.markdown("".join(chunks) + "▌")
+            last_render = now
+
+    response = "".join(chunks)
+    placeholder.markdown(response)
+
+    end_time = time.time()
+    usage = usage_to_dict(usage)
+    if usage:
+        generated_tokens = usage["completion_tokens"]
+    else:
+        generated_tokens = chunk_count  # ~1 token par chunk SSE
+
+    ttft = round(first_token_time - start_time, 2) if first_token_time else None
+    generation_time = end_time - (first_token_time or start_time)
+    tokens_per_second = round(generated_tokens / generation_time, 1) if generation_time > 0 else None
+
+    return response, {
+        "ttft": ttft,
+        "tokens_per_second": tokens_per_second,
+        "generated_tokens": generated_tokens,
+        "usage": usage,
+        "endpoint": stream.endpoint,
+        "queue_wait": round(stream.queue_wait, 3),
+        "generation_time": round(end_time - first_token_time, 2) if first_token_time else None,
+    }
+
+# Slots d'exécution et quotas partagés par toutes les sessions du process
+@st.cache_resource
+def init_scheduler():
+    return ExecutionScheduler(
+        max_concurrent=EXECUTION_MAX_CONCURRENT,
+        cpu_quota=SESSION_CPU_QUOTA,
+        quota_window=SESSION_QUOTA_WINDOW,
+        memory_quota_mb=SESSION_MEMORY_QUOTA_MB,
+    )
+
+# Pool de workers partagé entre les sessions (stack scientifique pré-importée)
+@st.cache_resource
+def init_worker_pool():
+    return WorkerPool(size=EXECUTION_WORKERS, figure_options=FIGURE_OPTIONS, scheduler=init_scheduler())
+
+# Résultats d'exécution mémorisés (code déterministe uniquement), partagés entre les sessions
+@st.cache_resource
+def init_execution_cache():
+    return ExecutionCache(
+        max_entries=EXECUTION_CACHE_ENTRIES,
+        max_bytes=EXECUTION_CACHE_MB * 1024 * 1024,
+        fingerprint=environment_fingerprint({"figures": FIGURE_OPTIONS}),
+    )
+
+# Kernels des conversations partagés par le process (évincés après inactivité)
+@st.cache_resource
+def init_kernel_manager():
+    return KernelManager(
+        max_kernels=KERNEL_MAX,
+        idle_timeout=KERNEL_IDLE_TIMEOUT,
+        max_memory_mb=KERNEL_MAX_MEMORY_MB,
+        figure_options=FIGURE_OPTIONS,
+        scheduler=init_scheduler(),
+    )
+
+def execute_code_blocks(code_blocks, timeout=EXECUTION_TIMEOUT, cpu_timeout=EXECUTION_CPU_TIMEOUT, use_cache=True,
+                        kernel_id=None, on_output=None, session_id=None, on_queue=None):
+    """Exécute plusieurs blocs en parallèle, produit (index, résultat) dans l'ordre de fin.
+
+    `on_output(index, texte)` reçoit la sortie en direct et `on_queue(index, position)` la position
+    dans la file d'attente, dans le thread du script.
+    """
+    results = {}
+    pending = []
+    for i, code in enumerate(code_blocks):
+        if code.strip():
+            pending.append((i, code.strip()))
+        else:
+            results[i] = {"success": False, "output": "", "error": "Code vide"}
+    
+    yield from results.items()
+    
+    codes = [code for _, code in pending]
+    events = queue.Queue()
+    
+    def relay(kind, callback):
+        return None if callback is None else (lambda j, value: events.put((kind, j, value)))
+    
+    run_options = dict(
+        timeout=timeout, cpu_timeout=cpu_timeout, session_id=session_id,
+        on_output=relay("output", on_output), on_queue=relay("queued", on_queue),
+    )
+    if kernel_id is not None:
+        # Kernel de la conversation: blocs dans l'ordre, sans cache (le résultat dépend du namespace)
+        runs = init_kernel_manager().run_many(kernel_id, codes, **run_options)
+    else:
+        cache = init_execution_cache() if use_cache else None
+        runs = run_cached(init_worker_pool(), cache, codes, **run_options)
+    
+    if on_output is None and on_queue is None:
+        for j, result in runs:
+            yield pending[j][0], result
+        return
+    
+    # Exécutions dans un thread de fond: le script affiche la sortie et les résultats au fil de l'eau
+    def consume():
         try:
-            import pandas as pd
-            safe_globals['pd'] = pd
-            safe_globals['pandas'] = pd
-        except:
-            pass
-        
-        # Exécuter le code
-        exec(code, safe_globals)
-        
-        # Restaurer stdout et stderr
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
-        
-        output = captured_output.getvalue()
-        error = captured_error.getvalue()
-        
-        return {
-            'success': True,
-            'output': output,
-            'error': error if error else None
-        }
-        
-    except Exception as e:
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
-        return {
-            'success': False,
-            'output': '',
-            'error': str(e) + '\n' + traceback.format_exc()
-        }
+            for j, result in runs:
+                events.put(("result", j, result))
+        except Exception as e:
+            events.put(("error", None, e))
+        finally:
+            events.put(None)
+    
+    threading.Thread(target=consume, name="code-blocks", daemon=True).start()
+    while (event := events.get()) is not None:
+        kind, j, payload = event
+        if kind == "error":
+            raise payload
+        if kind == "output":
+            on_output(pending[j][0], payload)
+        elif kind == "queued":
+            on_queue(pending[j][0], payload)
+        else:
+            yield pending[j][0], payload
 
-def extract_code_blocks(text, language="python"):
-    """Extrait les blocs de code d'un texte"""
-    pattern = f"```{language}\\s*\\n(.*?)\\n```"
-    matches = re.findall(pattern, text, re.DOTALL)
-    return matches
+# Figures relues depuis le disque, mises en cache par hash de contenu
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def load_figure(content_hash, image_format):
+    return init_conversation_store().load_figure(content_hash, image_format)
 
-def extract_json_from_text(text):
-    """Extrait le JSON d'un texte"""
-    try:
-        # Chercher les blocs JSON
-        json_pattern = r"```json\s*\n(.*?)\n```"
-        matches = re.findall(json_pattern, text, re.DOTALL)
-        
-        for match in matches:
-            try:
-                return json.loads(match.strip())
-            except:
-                continue
-        
-        # Si pas de bloc ```json, chercher du JSON brut
-        json_pattern = r'\{[^{}]*"files"[^{}]*\}'
-        matches = re.findall(json_pattern, text, re.DOTALL)
-        
-        for match in matches:
-            try:
-                return json.loads(match)
-            except:
-                continue
-                
-        return None
-    except:
-        return None
+def render_figures(figures):
+    """Affiche les figures (octets du résultat ou fichier stocké)"""
+    for figure in figures:
+        data = figure.get("data") or load_figure(figure["hash"], figure["format"])
+        if data:
+            st.image(data, width=min(figure["width"], 800))
+        else:
+            st.caption("🖼️ Figure indisponible")
+
+def render_execution_result(result, figures_key=None):
+    """Affiche le résultat d'une exécution (figures chargées à la demande si `figures_key` est donné)"""
+    if result["success"]:
+        if result["output"]:
+            st.success("✅ Exécution réussie")
+            st.code(result["output"], language="text")
+        if result.get("error"):
+            st.warning(f"⚠️ Warnings: {result['error']}")
+    else:
+        st.error("❌ Erreur d'exécution")
+        if result.get("output"):
+            st.code(result["output"], language="text")
+        st.code(result["error"], language="text")
+    
+    if result.get("kernel_restarted"):
+        reason = "mémoire dépassée" if result["kernel_restarted"] == "memory" else "exécution interrompue"
+        st.warning(f"🧠 Kernel redémarré ({reason}): les variables des tours précédents sont perdues")
+    
+    figures = result.get("figures")
+    if figures:
+        if figures_key is None or st.toggle(f"🖼️ Afficher {len(figures)} figure(s)", key=figures_key):
+            render_figures(figures)
+    
+    if result.get("duration") is not None:
+        st.caption(f"⏱️ {result['duration']}s" + (" · ♻️ résultat en cache" if result.get("cache_hit") else ""))
+
+# Catalogue des projets partagé entre les sessions
+@st.cache_resource
+def init_project_catalog():
+    return ProjectCatalog(CATALOG_FILE, PROJECTS_DIR)
+
+def register_project(project_path, description, created_files, total_size):
+    """Indexe le projet (le sidebar ne parcourt plus le disque)"""
+    init_project_catalog().add(
+        project_path,
+        description=description,
+        file_count=len(created_files),
+        total_size=total_size
+    )
 
 def create_project_structure(project_data):
     """Crée la structure d'un projet complet"""
     try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        project_name = project_data.get('name', 'project').replace(' ', '_').lower()
-        project_name = re.sub(r'[^a-z0-9_]', '', project_name)
-        project_path = PROJECTS_DIR / f"{project_name}_{timestamp}"
-        project_path.mkdir(parents=True, exist_ok=True)
-        
-        created_files = []
-        
-        for file_info in project_data.get('files', []):
-            if isinstance(file_info, dict) and 'name' in file_info and 'content' in file_info:
-                file_path = project_path / file_info['name']
-                
-                # Créer les dossiers nécessaires
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_info['content'])
-                
-                created_files.append(str(file_path.relative_to(PROJECTS_DIR)))
+        project_path, created_files, total_size = write_project(PROJECTS_DIR, project_data)
+        register_project(project_path, project_data.get('description', ''), created_files, total_size)
         
         return project_path, created_files
     except Exception as e:
         st.error(f"Erreur création projet: {e}")
         return None, []
 
-def create_download_zip(project_path):
-    """Crée un zip téléchargeable du projet"""
-    try:
-        zip_path = project_path.with_suffix('.zip')
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in project_path.rglob('*'):
-                if file_path.is_file():
-                    arcname = file_path.relative_to(project_path)
-                    zipf.write(file_path, arcname)
+class StreamingProjectWriter:
+    """Écrit les fichiers du projet sur disque pendant que le modèle génère"""
+    
+    def __init__(self, tree_placeholder):
+        self.parser = ProjectStreamParser()
+        self.tree_placeholder = tree_placeholder
+        self.project_path = None
+        self.created_files = []
+        self.total_size = 0
+        self.write_time = 0.0
+        self.error = None
+    
+    def feed(self, delta):
+        if self.error:
+            return
+        try:
+            for file_info in self.parser.feed(delta):
+                if self.project_path is None:
+                    self.project_path = new_project_dir(PROJECTS_DIR, self.parser.meta.get('name'))
+                
+                write_start = time.perf_counter()
+                written = write_project_file(PROJECTS_DIR, self.project_path, file_info)
+                self.write_time += time.perf_counter() - write_start
+                if written:
+                    self.created_files.append(written[0])
+                    self.total_size += written[1]
+                    self.tree_placeholder.markdown(
+                        "**📁 Fichiers créés:**\n" + "\n".join(f"- 📄 `{f}`" for f in self.created_files)
+                    )
+        except Exception as e:
+            # Ne pas interrompre le streaming: retour au traitement après génération
+            self.error = e
+    
+    def reset(self):
+        """Abandonne les fichiers écrits (la génération reprend depuis le début)"""
+        if self.project_path is not None:
+            shutil.rmtree(self.project_path, ignore_errors=True)
+        self.parser = ProjectStreamParser()
+        self.project_path = None
+        self.created_files = []
+        self.total_size = 0
+        self.write_time = 0.0
+        self.error = None
+        self.tree_placeholder.empty()
+    
+    def finish(self):
+        """Termine le projet: retourne (project_data, project_path, created_files)"""
+        self.tree_placeholder.empty()
+        if self.error or self.project_path is None:
+            return None, None, []
         
-        return zip_path
+        # Bloc complet: données du modèle; bloc tronqué: fichiers déjà écrits
+        project_data = self.parser.project or {**self.parser.meta, "files": self.parser.files}
+        register_project(self.project_path, project_data.get('description', ''), self.created_files, self.total_size)
+        return project_data, self.project_path, self.created_files
+
+# Archives en mémoire, mises en cache par hash du contenu (content_hash sert de clé)
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_zip_bytes(content_hash, project_path, compresslevel):
+    return project_archive.build_zip_bytes(project_path, compresslevel)
+
+def create_download_zip(project_path, compresslevel=6):
+    """Crée un zip téléchargeable du projet (en mémoire, réutilisé si le projet n'a pas changé)"""
+    try:
+        content_hash = project_archive.project_content_hash(project_path)
+        return _cached_zip_bytes(content_hash, str(project_path), compresslevel)
     except Exception as e:
         st.error(f"Erreur création ZIP: {e}")
         return None
 
-def create_advanced_prompt(user_message, mode="standard"):
-    """Crée un prompt avancé pour différents types de tâches"""
-    
-    if mode == "code_generation":
-        system_prompt = """Tu es un développeur expert capable de créer des applications complètes et fonctionnelles.
-
-CAPACITÉS:
-🔧 Applications web (HTML/CSS/JS, React, Vue)
-📱 Applications mobiles (concepts React Native, Flutter)
-💻 Applications desktop (Electron, Python tkinter)
-🌐 APIs et backends (Python Flask/FastAPI, Node.js)
-📊 Outils d'analyse (Python data science)
-🎮 Jeux web (JavaScript, Canvas)
-
-FORMAT DE RÉPONSE pour projets:
-```json
-{
-  "name": "nom_du_projet",
-  "description": "Description complète",
-  "type": "web/mobile/desktop/api/tool",
-  "files": [
-    {
-      "name": "index.html",
-      "content": "<!DOCTYPE html>...",
-      "description": "Page principale"
-    },
-    {
-      "name": "style.css", 
-      "content": "body { margin: 0; }...",
-      "description": "Styles CSS"
-    }
-  ],
-  "installation": "Instructions détaillées",
-  "usage": "Comment utiliser l'application"
-}
-```
-
-RÈGLES:
-- Toujours fournir du code complet et fonctionnel
-- Inclure tous les fichiers nécessaires
-- Ajouter des commentaires explicatifs
-- Design moderne et responsive
-- Optimisé pour mobile et desktop
-
-Crée cette application:"""
-
-    elif mode == "code_execution":
-        system_prompt = """Tu es un expert Python capable d'écrire et d'exécuter du code pour résoudre des problèmes.
-
-CAPACITÉS:
-⚡ Calculs et algorithmes
-📊 Visualisations (matplotlib, plotly si disponible)  
-📈 Analyse de données (pandas, numpy si disponible)
-🧮 Mathématiques et statistiques
-🔍 Traitement de texte et regex
-🎲 Simulations et modélisation
-
-RÈGLES:
-- Écris du code Python complet et exécutable
-- Utilise print() pour afficher les résultats
-- Ajoute des commentaires explicatifs
-- Gère les erreurs potentielles
-- Optimise pour la lisibilité
-
-Résous ce problème avec du code Python:"""
-
-    else:  # mode standard
-        system_prompt = """Tu es un assistant IA très avancé avec des capacités complètes de développement.
-
-🎯 CAPACITÉS PRINCIPALES:
-🔧 Développement (web, mobile, desktop, APIs)
-⚡ Exécution et test de code Python
-💡 Résolution de problèmes complexes
-📊 Analyse de données et visualisations
-🎨 Design et interfaces utilisateur
-📝 Rédaction et création de contenu
-🚀 Innovation et brainstorming
-
-STYLE DE RÉPONSE:
-- Réponses détaillées et complètes
-- Explications techniques claires
-- Exemples pratiques
-- Solutions immédiatement utilisables
-- Adaptées au niveau de l'utilisateur
-
-Réponds de manière complète et détaillée:"""
-
-    return [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message}
-    ]
-
 # Vérification du token
 if not os.environ.get("HF_TOKEN"):
     st.error("❌ Token HF_TOKEN non configuré. Créez un fichier .env avec votre token Hugging Face")
     st.info("Format du fichier .env:\n```\nHF_TOKEN=votre_token_ici\n```")
     st.stop()
 
-# Initialisation du client
+# Pré-chargement des modules lourds en arrière-plan (une fois par process)
+@st.cache_resource
+def prewarm_heavy_modules():
+    return prewarm(["openai", "request_pipeline", "model_router", "project_archive"])
+
+# Temps de démarrage partagé par le process (premier run = cold start)
+@st.cache_resource
+def startup_stats():
+    return {}
+
+prewarm_heavy_modules()
+
+# Initialisation du client (import d'openai différé jusqu'à la première requête)
+# Pipeline async partagé par base_url: pool HTTP keep-alive, retries avec backoff, limite de concurrence
+# Le routeur choisit l'endpoint le plus rapide pour chaque mode et bascule en cas d'erreur
 @st.cache_resource
 def init_client():
-    return OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=os.environ["HF_TOKEN"],
+    return build_router(
+        parse_endpoints(LLM_ENDPOINTS, LLM_BASE_URL),
+        os.environ,
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES,
+        deadline=LLM_DEADLINE,
     )
 
+# Cache des réponses partagé entre les sessions
+@st.cache_resource
+def init_response_cache():
+    return ResponseCache(CACHE_FILE)
+
+# Index des prompts pour les réponses similaires (chargé au premier usage)
+@st.cache_resource
+def init_similarity_cache():
+    return similarity_cache.SimilarityCache(SIMILARITY_FILE, max_entries_per_mode=SIMILARITY_MAX_ENTRIES)
+
+# Registre d'utilisation partagé entre les sessions
+@st.cache_resource
+def init_usage_ledger():
+    return UsageLedger(LEDGER_FILE, legacy_json=CREDITS_FILE)
+
+# Conversations persistées sur disque
+@st.cache_resource
+def init_conversation_store():
+    return ConversationStore(CONVERSATIONS_DIR)
+
+# Métriques et traces partagées par le process (endpoint /metrics démarré une fois)
+@st.cache_resource
+def init_telemetry():
+    telemetry = Telemetry(trace_log=TRACE_LOG)
+    if METRICS_PORT:
+        telemetry.serve(port=METRICS_PORT)
+    return telemetry
+
 try:
-    client = init_client()
+    response_cache = init_response_cache()
+    usage_ledger = init_usage_ledger()
+    conversation_store = init_conversation_store()
+    telemetry = init_telemetry()
     st.success("✅ Système avancé initialisé avec succès", icon="🚀")
 except Exception as e:
     st.error(f"❌ Erreur d'initialisation: {e}")
     st.stop()
 
-# Charger les données
-credits_data = load_credits_usage()
+# Charger les données (agrégats pré-calculés)
+credits_data = usage_ledger.totals()
 
 # En-tête avancé
 st.markdown('<h1 class="main-header">🧠 OpenAI 120B Advanced</h1>', unsafe_allow_html=True)
@@ -474,6 +598,82 @@ if "messages" not in st.session_state:
     st.session_state.session_requests = 0
     st.session_state.projects_created = 0
     st.session_state.code_executions = 0
+    st.session_state.conversation_id = None
+    st.session_state.history_cursor = None
+    st.session_state.history_window = HISTORY_WINDOW
+
+# Identifiant de la session navigateur (file d'attente et quotas d'exécution)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+def resolve_owner():
+    """Propriétaire des conversations: compte connecté, sinon jeton anonyme gardé dans l'URL"""
+    try:
+        if st.user.is_logged_in and st.user.email:
+            return f"user:{st.user.email}"
+    except AttributeError:  # authentification non configurée
+        pass
+    token = st.query_params.get(OWNER_PARAM, "")
+    if len(token) != 32 or any(c not in "0123456789abcdef" for c in token):
+        token = uuid.uuid4().hex
+        st.query_params[OWNER_PARAM] = token
+    return f"anon:{token}"
+
+# Seules les conversations (et donc les kernels) du propriétaire sont listées et ouvertes
+if "owner_id" not in st.session_state:
+    st.session_state.owner_id = resolve_owner()
+
+def add_message(message):
+    """Ajoute un message à l'historique et l'enregistre sur disque"""
+    # Figures écrites à part: l'historique et le JSONL ne gardent que leurs métadonnées
+    message = conversation_store.externalize_figures(message)
+    st.session_state.messages.append(message)
+    
+    if st.session_state.conversation_id is None:
+        st.session_state.conversation_id = conversation_store.create(message["content"], st.session_state.owner_id)
+    
+    tokens = message.get("tokens", {})
+    conversation_store.append(
+        st.session_state.conversation_id,
+        message,
+        tokens=tokens.get("input", 0) + tokens.get("output", 0)
+    )
+
+def restart_kernel():
+    """Repart d'un namespace vide pour la conversation courante"""
+    if init_kernel_manager().restart(st.session_state.conversation_id):
+        st.toast("🔄 Kernel redémarré")
+
+def regenerate_response():
+    """Remplace la question et la réponse similaire proposée par une réponse générée par le modèle"""
+    messages = st.session_state.messages
+    if len(messages) < 2 or not messages[-1].get("metrics", {}).get("similar"):
+        return
+    prompt = messages[-2]["content"]
+    del messages[-2:]
+    conversation_store.remove_last(st.session_state.conversation_id, 2)
+    st.session_state.regenerate_prompt = prompt
+
+def open_conversation(conversation_id):
+    """Rouvre une conversation en ne chargeant que la page la plus récente"""
+    if not conversation_store.is_owner(conversation_id, st.session_state.owner_id):
+        return
+    messages, cursor = conversation_store.load_page(conversation_id, HISTORY_PAGE_SIZE)
+    st.session_state.messages = messages
+    st.session_state.conversation_id = conversation_id
+    st.session_state.history_cursor = cursor
+    st.session_state.history_window = HISTORY_WINDOW
+
+def show_earlier_messages():
+    """Élargit la fenêtre d'historique, en chargeant une page depuis le disque si besoin"""
+    hidden = len(st.session_state.messages) - st.session_state.history_window
+    if hidden <= 0 and st.session_state.history_cursor is not None:
+        older, cursor = conversation_store.load_page(
+            st.session_state.conversation_id, HISTORY_PAGE_SIZE, before=st.session_state.history_cursor
+        )
+        st.session_state.messages = older + st.session_state.messages
+        st.session_state.history_cursor = cursor
+    st.session_state.history_window += HISTORY_WINDOW
 
 # Sidebar avancée
 with st.sidebar:
@@ -503,16 +703,50 @@ with st.sidebar:
         if st.session_state.code_executions > 0:
             st.metric("⚡ Codes Exec", st.session_state.code_executions)
     
+    cache_stats = response_cache.stats()
+    if cache_stats["hits"] or cache_stats["misses"]:
+        st.caption(f"💾 Cache: {cache_stats['hits']} hits / {cache_stats['misses']} miss · {cache_stats['disk_entries']} entrées")
+    execution_usage = init_scheduler().usage(st.session_state.session_id)
+    if execution_usage["cpu_used"] or execution_usage["queued"]:
+        st.caption(f"⏱️ CPU session: {execution_usage['cpu_used']:g}s / {execution_usage['cpu_quota']:g}s · "
+                   f"{execution_usage['running']} en cours, {execution_usage['queued']} en attente")
+    execution_cache_stats = init_execution_cache().stats()
+    if execution_cache_stats["hits"] or execution_cache_stats["misses"]:
+        st.caption(f"♻️ Exécutions: {execution_cache_stats['hits']} hits / {execution_cache_stats['misses']} miss · {execution_cache_stats['entries']} entrées")
+    
     # Paramètres IA
     st.subheader("🤖 Paramètres IA")
     temperature = st.slider("🌡️ Créativité", 0.1, 2.0, 0.8, 0.1, help="Plus élevé = plus créatif")
     max_tokens = st.slider("📝 Longueur Max", 1000, 4000, 2500, 250, help="Tokens maximum par réponse")
+    context_budget = st.slider("🧠 Budget Contexte", 1000, 16000, 4000, 500, help="Tokens maximum envoyés au modèle (historique résumé au-delà)")
     
     # Options avancées
     st.subheader("🔬 Options Avancées")
     auto_execute = st.checkbox("⚡ Auto-exec Python", value=False, help="Exécuter automatiquement le code Python généré")
     create_projects = st.checkbox("📁 Auto-create Projects", value=True, help="Créer automatiquement les structures de projet")
     show_metrics = st.checkbox("📊 Afficher Métriques", value=True, help="Afficher les métriques détaillées")
+    use_cache = st.checkbox("💾 Cache Réponses", value=True, help="Réutiliser les réponses déjà générées pour une requête identique")
+    use_similar = st.checkbox("🔁 Réponses Similaires", value=False, disabled=not use_cache,
+                              help="Proposer la réponse déjà générée pour une première question proche (reformulation)")
+    if use_similar and use_cache:
+        similarity_threshold = st.slider("🎚️ Seuil de Similarité", 0.5, 0.99, SIMILARITY_THRESHOLD, 0.01,
+                                         help="Plus élevé = seules les reformulations très proches sont réutilisées")
+        similarity_stats = init_similarity_cache().stats()
+        st.caption(f"🔁 {similarity_stats['hits']} hits / {similarity_stats['misses']} miss · "
+                   f"{sum(similarity_stats['entries'].values())} prompts indexés")
+    zip_compression = st.selectbox("🗜️ Compression ZIP", ["Rapide", "Standard", "Maximale"], index=1,
+                                   help="Niveau de compression des archives (images et archives toujours stockées telles quelles)")
+    zip_compresslevel = {"Rapide": 1, "Standard": 6, "Maximale": 9}[zip_compression]
+    stream_responses = st.checkbox("🌊 Streaming", value=True, help="Afficher la réponse au fur et à mesure de la génération")
+    use_execution_cache = st.checkbox("♻️ Cache Exécutions", value=True,
+                                      help="Réutiliser le résultat d'un code déjà exécuté (hors code utilisant random/time ou marqué # no-cache)")
+    use_kernel = st.checkbox("🧠 Kernel Persistant", value=True,
+                             help="Les variables d'une exécution restent disponibles aux tours suivants de la conversation (sans cache d'exécution)")
+    if use_kernel and st.session_state.conversation_id:
+        kernel_info = init_kernel_manager().info(st.session_state.conversation_id)
+        if kernel_info:
+            st.caption(f"🧠 Kernel actif: {kernel_info['runs']} exécutions · inactif depuis {kernel_info['idle_seconds']}s")
+            st.button("🔄 Redémarrer le Kernel", on_click=restart_kernel, use_container_width=True)
     
     st.markdown("---")
     
@@ -522,20 +756,23 @@ with st.sidebar:
         if st.button("🗑️ Reset", type="secondary", use_container_width=True):
             # Sauvegarder les stats avant reset
             if st.session_state.session_tokens > 0:
-                credits_data['sessions'].append({
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "tokens": st.session_state.session_tokens,
-                    "requests": st.session_state.session_requests,
-                    "projects": st.session_state.projects_created,
-                    "executions": st.session_state.code_executions
-                })
-                save_credits_usage(credits_data)
+                usage_ledger.record_session(
+                    tokens=st.session_state.session_tokens,
+                    requests=st.session_state.session_requests,
+                    projects=st.session_state.projects_created,
+                    executions=st.session_state.code_executions
+                )
+            if use_kernel and st.session_state.conversation_id:
+                init_kernel_manager().restart(st.session_state.conversation_id)
             
             st.session_state.messages = []
             st.session_state.session_tokens = 0
             st.session_state.session_requests = 0
             st.session_state.projects_created = 0
             st.session_state.code_executions = 0
+            st.session_state.conversation_id = None
+            st.session_state.history_cursor = None
+            st.session_state.history_window = HISTORY_WINDOW
             st.rerun()
     
     with col2:
@@ -545,60 +782,131 @@ with st.sidebar:
     # Stats détaillées
     if st.session_state.get('show_detailed_stats', False):
         st.subheader("📈 Stats Détaillées")
-        if credits_data.get('sessions'):
-            recent_sessions = credits_data['sessions'][-5:]
-            for i, session in enumerate(reversed(recent_sessions)):
-                st.text(f"Session {len(recent_sessions)-i}: {session.get('tokens', 0):,} tokens")
-    
-    # Projets créés
-    if PROJECTS_DIR.exists():
-        projects = [p for p in PROJECTS_DIR.iterdir() if p.is_dir()]
-        if projects:
-            st.subheader("📂 Projets Récents")
-            for project in sorted(projects, key=lambda x: x.stat().st_mtime, reverse=True)[:3]:
-                project_name = project.name[:20] + "..." if len(project.name) > 23 else project.name
-                st.text(f"📁 {project_name}")
-                
-                if st.button(f"📥 ZIP", key=f"dl_{project.name}", help="Télécharger le projet"):
-                    zip_path = create_download_zip(project)
-                    if zip_path and zip_path.exists():
-                        with open(zip_path, 'rb') as f:
-                            st.download_button(
-                                "💾 Télécharger",
-                                f.read(),
-                                file_name=f"{project.name}.zip",
-                                mime="application/zip",
-                                key=f"download_{project.name}"
-                            )
+        recent_sessions = usage_ledger.recent_sessions(5)
+        for i, session in enumerate(recent_sessions):
+            st.text(f"Session {len(recent_sessions)-i}: {session['tokens']:,} tokens")
+        
+        daily = usage_ledger.rollups("day", limit=7)
+        if daily:
+            st.markdown("**📅 Par jour:**")
+            for day in daily:
+                st.text(f"{day['key']}: {day['tokens']:,} tokens · {day['requests']} req")
+        
+        per_mode = usage_ledger.rollups("mode")
+        if per_mode:
+            st.markdown("**🎯 Par mode:**")
+            for mode_stats in per_mode:
+                st.text(f"{mode_stats['key']}: {mode_stats['tokens']:,} tokens · {mode_stats['requests']} req")
+    
+    # Conversations récentes
+    recent_conversations = conversation_store.list(st.session_state.owner_id, 5)
+    if recent_conversations:
+        st.subheader("💬 Conversations")
+        for conversation in recent_conversations:
+            is_current = conversation["id"] == st.session_state.conversation_id
+            label = f"{'▶️ ' if is_current else ''}{conversation['title'][:30]}"
+            if st.button(label, key=f"conv_{conversation['id']}", use_container_width=True,
+                         help=f"{conversation['message_count']} messages · {conversation['tokens']:,} tokens"):
+                open_conversation(conversation["id"])
+                st.rerun()
+    
+    # Projets créés (lus depuis le catalogue)
+    project_catalog = init_project_catalog()
+    project_catalog.refresh_if_stale()
+    total_projects = project_catalog.count()
+    if total_projects:
+        st.subheader("📂 Projets Récents")
+        project_search = st.text_input("🔎 Rechercher", key="project_search", placeholder="nom ou description")
+        matching_projects = project_catalog.count(project_search)
+        page_count = max(1, -(-matching_projects // PROJECTS_PAGE_SIZE))
+        projects_page = min(st.session_state.get("projects_page", 0), page_count - 1)
+        
+        for project_info in project_catalog.list(PROJECTS_PAGE_SIZE, projects_page * PROJECTS_PAGE_SIZE, project_search):
+            project = PROJECTS_DIR / project_info["name"]
+            project_name = project.name[:20] + "..." if len(project.name) > 23 else project.name
+            st.text(f"📁 {project_name}")
+            st.caption(f"{project_info['file_count']} fichiers · {project_info['total_size'] / 1024:.1f} Ko")
+            
+            if st.button(f"📥 ZIP", key=f"dl_{project.name}", help="Télécharger le projet"):
+                zip_bytes = create_download_zip(project, zip_compresslevel)
+                if zip_bytes:
+                    st.download_button(
+                        "💾 Télécharger",
+                        zip_bytes,
+                        file_name=f"{project.name}.zip",
+                        mime="application/zip",
+                        key=f"download_{project.name}"
+                    )
+        
+        if page_count > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀", key="projects_prev", disabled=projects_page == 0):
+                    st.session_state.projects_page = projects_page - 1
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {projects_page + 1}/{page_count} · {matching_projects} projets")
+            with col3:
+                if st.button("▶", key="projects_next", disabled=projects_page >= page_count - 1):
+                    st.session_state.projects_page = projects_page + 1
+                    st.rerun()
+    
+    # Profil de démarrage
+    with st.expander("⏱️ Profil Démarrage"):
+        stats = startup_stats()
+        if "cold_start_ms" in stats:
+            st.text(f"Cold start: {stats['cold_start_ms']:.0f} ms")
+        last_rerun_ms = st.session_state.get("last_rerun_ms")
+        if last_rerun_ms is not None:
+            status = "✅" if last_rerun_ms <= RERUN_BUDGET_MS else "⚠️"
+            st.text(f"{status} Dernier rerun: {last_rerun_ms:.0f} ms (budget {RERUN_BUDGET_MS:.0f} ms)")
+        
+        timings = import_profile()
+        if timings:
+            st.markdown("**Imports (ms):**")
+            for module_name, elapsed_ms in timings:
+                st.text(f"{module_name}: {elapsed_ms:.1f}")
+        else:
+            st.caption("Aucun module lourd chargé pour l'instant")
+
+    # Latences par endpoint (le routeur n'est créé qu'à la première requête)
+    if st.session_state.session_requests:
+        with st.expander("🛰️ Endpoints"):
+            for name, endpoint_stats in init_client().summary().items():
+                st.markdown(f"**{name}**")
+                if not endpoint_stats["requests"]:
+                    st.caption("Pas encore de mesure")
+                    continue
+                ttft_caption = (
+                    f"TTFT p50 {endpoint_stats['ttft_p50']:.2f}s · p95 {endpoint_stats['ttft_p95']:.2f}s"
+                    if endpoint_stats["ttft_p50"] is not None else "TTFT -"
+                )
+                tps = endpoint_stats["tokens_per_second"]
+                st.caption(
+                    f"{ttft_caption} · {f'{tps:.0f} tok/s' if tps else '- tok/s'} · "
+                    f"erreurs {endpoint_stats['error_rate']:.0%} ({endpoint_stats['requests']} req)"
+                )
 
 # Zone principale
 st.markdown("### 💬 Assistant IA Advanced")
 
-# Afficher les messages
-for i, message in enumerate(st.session_state.messages):
+def render_message(message, expanded, key):
+    """Affiche un message de l'historique avec ses résultats et projets"""
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
         
-        # Afficher les résultats d'exécution
-        if "execution_result" in message:
-            result = message["execution_result"]
-            
-            with st.expander("⚡ Résultat d'Exécution", expanded=True):
-                if result["success"]:
-                    if result["output"]:
-                        st.success("✅ Exécution réussie")
-                        st.code(result["output"], language="text")
-                    if result.get("error"):
-                        st.warning(f"⚠️ Warnings: {result['error']}")
-                else:
-                    st.error("❌ Erreur d'exécution")
-                    st.code(result["error"], language="text")
+        # Afficher les résultats d'exécution (un par bloc de code)
+        for j, result in enumerate(message.get("execution_results", [])):
+            title = "⚡ Résultat d'Exécution" if len(message["execution_results"]) == 1 else f"⚡ Résultat Code {j+1}"
+            with st.expander(title, expanded=expanded):
+                # Messages repliés: figures chargées seulement à la demande
+                render_execution_result(result, figures_key=None if expanded else f"figures_{key}_{j}")
         
         # Afficher les projets créés
         if "project_created" in message:
             project_info = message["project_created"]
             
-            with st.expander("🚀 Projet Créé", expanded=True):
+            with st.expander("🚀 Projet Créé", expanded=expanded):
                 st.success(f"✅ **{project_info['name']}** créé avec succès!")
                 st.markdown(f"**Description:** {project_info['description']}")
                 
@@ -607,6 +915,24 @@ for i, message in enumerate(st.session_state.messages):
                     for file_path in project_info['files']:
                         st.text(f"📄 {file_path}")
 
+# Fragment isolé: "Messages précédents" ne relance que l'historique, pas toute l'app
+@st.fragment
+def render_history():
+    """Affiche les derniers messages (fenêtre glissante) pour un coût de rerun constant"""
+    messages = st.session_state.messages
+    hidden = max(0, len(messages) - st.session_state.history_window)
+    
+    if hidden or st.session_state.history_cursor is not None:
+        label = f"⬆️ Messages précédents ({hidden} masqués)" if hidden else "⬆️ Messages précédents"
+        st.button(label, on_click=show_earlier_messages, use_container_width=True)
+    
+    visible = messages[hidden:]
+    for i, message in enumerate(visible):
+        # Seul le dernier message garde ses détails dépliés
+        render_message(message, expanded=i == len(visible) - 1, key=hidden + i)
+
+render_history()
+
 # Input utilisateur avec placeholders adaptatifs
 placeholder_map = {
     "🔧 Génération de Code": "Décrivez l'application à créer (ex: 'Crée une calculatrice web moderne')",
@@ -615,13 +941,24 @@ placeholder_map = {
     "💬 Chat Standard": "Posez votre question ou décrivez ce que vous voulez..."
 }
 
-if prompt := st.chat_input(placeholder_map.get(work_mode, "Votre message...")):
+regenerate_prompt = st.session_state.pop("regenerate_prompt", None)
+if prompt := st.chat_input(placeholder_map.get(work_mode, "Votre message...")) or regenerate_prompt:
     # Ajouter le message utilisateur
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message({"role": "user", "content": prompt})
     
     with st.chat_message("user"):
         st.markdown(prompt)
     
+    # Choisir le type de prompt selon le mode
+    mode_map = {
+        "🔧 Génération de Code": "code_generation",
+        "⚡ Exécution Python": "code_execution",
+        "🎨 Création d'Apps": "code_generation",
+        "💬 Chat Standard": "standard"
+    }
+    mode = mode_map.get(work_mode, "standard")
+    trace = telemetry.start_trace(mode)
+    
     # Générer la réponse selon le mode
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
@@ -630,80 +967,159 @@ if prompt := st.chat_input(placeholder_map.get(work_mode, "Votre message...")):
             with st.spinner(f"🧠 {work_mode.split()[-1]} en cours..."):
                 start_time = time.time()
                 
-                # Choisir le type de prompt selon le mode
-                mode_map = {
-                    "🔧 Génération de Code": "code_generation",
-                    "⚡ Exécution Python": "code_execution",
-                    "🎨 Création d'Apps": "code_generation",
-                    "💬 Chat Standard": "standard"
-                }
-                
-                api_messages = create_advanced_prompt(prompt, mode_map.get(work_mode, "standard"))
-                
-                # Ajouter l'historique récent (limité pour éviter les tokens excess)
-                if len(st.session_state.messages) > 1:
-                    recent_history = st.session_state.messages[-4:]  # 4 derniers messages
-                    for msg in recent_history[:-1]:  # Exclure le message actuel
-                        if len(msg["content"]) < 2000:  # Limiter la taille
-                            api_messages.append({
-                                "role": msg["role"], 
-                                "content": msg["content"][:1500] + "..." if len(msg["content"]) > 1500 else msg["content"]
-                            })
+                router = init_client()
+                # Prompt système (préfixe stable) + historique dans le budget + message actuel
+                with trace.span("prompt_build"):
+                    api_messages = build_context(
+                        create_advanced_prompt(prompt, mode, persistent_kernel=use_kernel),
+                        st.session_state.messages[:-1],  # Exclure le message actuel
+                        context_budget
+                    )
                 
-                completion = client.chat.completions.create(
-                    model="openai/gpt-oss-120b:together",
+                request_kwargs = dict(
                     messages=api_messages,
                     max_tokens=max_tokens,
                     temperature=temperature,
                 )
                 
-                response = completion.choices[0].message.content
+                cache_key = make_cache_key(LLM_MODEL, api_messages, temperature, max_tokens)
+                # Réponses similaires: seulement pour une première question (sans historique qui en change le sens),
+                # un index par mode et prompt système (quels que soient les réglages de génération)
+                similar_namespace = None
+                if use_cache and use_similar and len(st.session_state.messages) == 1 and not regenerate_prompt:
+                    similar_namespace = f"{mode}:{make_cache_key(LLM_MODEL, api_messages[:-1], None, None)[:16]}"
+                
+                similar_match = None
+                with trace.span("cache_lookup"):
+                    cached_response = response_cache.get(cache_key) if use_cache else None
+                    if cached_response is None and similar_namespace:
+                        similar_match = init_similarity_cache().lookup(similar_namespace, prompt, similarity_threshold)
+                        if similar_match:
+                            cached_response = response_cache.get(similar_match["cache_key"])
+                            if cached_response is None:
+                                similar_match = None  # réponse évincée du cache entre-temps
+                project_writer = None
+                
+                if cached_response is not None:
+                    # Réponse identique (ou question similaire) déjà générée: aucun appel au modèle
+                    response = cached_response
+                    response_metrics = {"cache_hit": True, "usage": None}
+                    if similar_match:
+                        response_metrics["similar"] = {"prompt": similar_match["prompt"], "score": similar_match["score"]}
+                        st.info(f"🔁 Réponse similaire trouvée ({similar_match['score']:.0%}) pour « {similar_match['prompt']} »")
+                        st.button("🔄 Générer une nouvelle réponse", on_click=regenerate_response)
+                    message_placeholder.markdown(response)
+                elif stream_responses:
+                    # Projets: écrire chaque fichier dès qu'il est complet dans le flux
+                    if create_projects and work_mode in ["🔧 Génération de Code", "🎨 Création d'Apps"]:
+                        project_writer = StreamingProjectWriter(st.empty())
+                    
+                    # Rendu progressif dans le placeholder
+                    response, response_metrics = stream_completion(
+                        router, mode, message_placeholder,
+                        on_delta=project_writer.feed if project_writer else None,
+                        on_restart=project_writer.reset if project_writer else None,
+                        **request_kwargs
+                    )
+                else:
+                    with trace.span("generation"):
+                        completion, endpoint = router.complete(mode, **request_kwargs)
+                    response = completion.choices[0].message.content
+                    response_metrics = {"usage": usage_to_dict(completion.usage), "endpoint": endpoint}
+                    
+                    # Afficher la réponse
+                    message_placeholder.markdown(response)
+                
                 response_time = round(time.time() - start_time, 2)
+                trace.model = response_metrics.get("endpoint") or ("cache" if response_metrics.get("cache_hit") else LLM_MODEL)
+                trace.record("queue", response_metrics.get("queue_wait"))
+                trace.record("ttft", response_metrics.get("ttft"))
+                trace.record("generation", response_metrics.get("generation_time"))
                 
-                # Afficher la réponse
-                message_placeholder.markdown(response)
+                if use_cache and cached_response is None and response:
+                    response_cache.set(cache_key, response)
+                    if similar_namespace:
+                        init_similarity_cache().add(similar_namespace, prompt, cache_key)
                 
                 # Préparer les données du message
                 message_data = {"role": "assistant", "content": response}
+                if response_metrics:
+                    message_data["metrics"] = {"response_time": response_time, **response_metrics}
                 
                 # Post-traitement selon le mode
+                projects_in_turn = 0
                 
                 # 1. Exécution automatique de code Python
                 if (work_mode == "⚡ Exécution Python" or auto_execute) and "```python" in response:
                     st.markdown("---")
                     st.markdown("### ⚡ Exécution du Code")
                     
-                    code_blocks = extract_code_blocks(response, "python")
+                    with trace.span("code_extraction"):
+                        code_blocks = extract_code_blocks(response, "python")
                     
                     if code_blocks:
+                        # Un expander par bloc, rempli dès que le bloc termine
+                        status_placeholders = []
                         for i, code in enumerate(code_blocks):
                             with st.expander(f"🔥 Code {i+1}", expanded=True):
                                 st.code(code, language="python")
-                                
-                                result = execute_python_code(code)
-                                message_data["execution_result"] = result
-                                
-                                if result["success"]:
-                                    if result["output"]:
-                                        st.success("✅ Exécution réussie")
-                                        st.code(result["output"], language="text")
-                                    if result.get("error"):
-                                        st.warning(f"⚠️ Warnings: {result['error']}")
-                                else:
-                                    st.error("❌ Erreur d'exécution")
-                                    st.code(result["error"], language="text")
+                                status = st.empty()
+                                status.info("⏳ Exécution en cours...")
+                                status_placeholders.append(status)
+                        
+                        execution_results = [None] * len(code_blocks)
+                        live_output = [""] * len(code_blocks)
                         
+                        def show_queue_position(i, position):
+                            status_placeholders[i].info(f"⏳ En file d'attente (position {position})")
+                        
+                        def show_live_output(i, chunk):
+                            # Seule la fin de la sortie est gardée pour l'affichage en direct
+                            live_output[i] = (live_output[i] + chunk)[-LIVE_OUTPUT_CHARS:]
+                            with status_placeholders[i].container():
+                                st.info("⏳ Exécution en cours...")
+                                st.code(live_output[i], language="text")
+                        
+                        for i, result in execute_code_blocks(
+                            code_blocks, use_cache=use_execution_cache,
+                            kernel_id=st.session_state.conversation_id if use_kernel else None,
+                            on_output=show_live_output,
+                            session_id=st.session_state.session_id,
+                            on_queue=show_queue_position
+                        ):
+                            execution_results[i] = result
+                            trace.record(
+                                "execution", 0.0 if result.get("cache_hit") else result.get("duration"),
+                                index=i, success=result["success"], cache_hit=bool(result.get("cache_hit"))
+                            )
+                            trace.record("execution_queue", result.get("queue_wait"), index=i)
+                            with status_placeholders[i].container():
+                                render_execution_result(result)
+                        
+                        message_data["execution_results"] = execution_results
                         st.session_state.code_executions += 1
                 
                 # 2. Création automatique de projets
                 if create_projects and work_mode in ["🔧 Génération de Code", "🎨 Création d'Apps"]:
-                    project_data = extract_json_from_text(response)
+                    # Fichiers déjà écrits pendant le streaming, sinon extraction de la réponse complète
+                    project_data, project_path, created_files = (
+                        project_writer.finish() if project_writer else (None, None, [])
+                    )
+                    if project_path is None:
+                        with trace.span("code_extraction"):
+                            project_data = extract_json_from_text(response)
+                    else:
+                        # Fichiers écrits au fil du flux: temps d'écriture cumulé
+                        trace.record("project_write", project_writer.write_time, files=len(created_files))
                     
                     if project_data and "files" in project_data:
                         st.markdown("---")
                         st.markdown("### 🚀 Création du Projet")
                         
-                        project_path, created_files = create_project_structure(project_data)
+                        if project_path is None:
+                            with trace.span("project_write") as span:
+                                project_path, created_files = create_project_structure(project_data)
+                                span["files"] = len(created_files)
                         
                         if project_path and created_files:
                             message_data["project_created"] = {
@@ -724,51 +1140,90 @@ if prompt := st.chat_input(placeholder_map.get(work_mode, "Votre message...")):
                             
                             with col2:
                                 # Créer et proposer le téléchargement
-                                zip_path = create_download_zip(project_path)
-                                if zip_path and zip_path.exists():
-                                    with open(zip_path, 'rb') as f:
-                                        st.download_button(
-                                            "📥 Télécharger Projet",
-                                            f.read(),
-                                            file_name=f"{project_data.get('name', 'project')}.zip",
-                                            mime="application/zip"
-                                        )
+                                with trace.span("zip"):
+                                    zip_bytes = create_download_zip(project_path, zip_compresslevel)
+                                if zip_bytes:
+                                    st.download_button(
+                                        "📥 Télécharger Projet",
+                                        zip_bytes,
+                                        file_name=f"{project_data.get('name', 'project')}.zip",
+                                        mime="application/zip"
+                                    )
                             
                             st.session_state.projects_created += 1
-                            credits_data['projects_created'] = credits_data.get('projects_created', 0) + 1
+                            projects_in_turn += 1
+                
+                # Calcul des tokens: usage réel de l'API, sinon tokenizer local
+                usage = response_metrics.get("usage")
+                if usage:
+                    input_tokens = usage["prompt_tokens"]
+                    output_tokens = usage["completion_tokens"]
+                else:
+                    input_tokens = count_message_tokens(api_messages)
+                    output_tokens = count_tokens(response)
+                
+                # Une réponse en cache ne coûte rien
+                total_tokens = 0 if response_metrics.get("cache_hit") else input_tokens + output_tokens
+                if total_tokens:
+                    trace.attributes.update(input_tokens=input_tokens, output_tokens=output_tokens)
+                message_data["tokens"] = {
+                    "input": input_tokens,
+                    "output": output_tokens,
+                    "source": "usage" if usage else count_source(),
+                }
                 
                 # Afficher les métriques
                 if show_metrics:
                     st.markdown("---")
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
-                        st.caption(f"⏱️ {response_time}s")
+                        timing_caption = f"⏱️ {response_time}s"
+                        if response_metrics.get("ttft") is not None:
+                            timing_caption += f" · TTFT {response_metrics['ttft']}s"
+                        if response_metrics.get("tokens_per_second"):
+                            timing_caption += f" · {response_metrics['tokens_per_second']} tok/s"
+                        if response_metrics.get("similar"):
+                            timing_caption += f" · 🔁 similaire {response_metrics['similar']['score']:.0%}"
+                        elif response_metrics.get("cache_hit"):
+                            timing_caption += " · 💾 cache"
+                        st.caption(timing_caption)
                     with col2:
-                        output_tokens = estimate_tokens(response)
                         st.caption(f"📝 {output_tokens} tokens")
                     with col3:
-                        input_tokens = sum(estimate_tokens(m["content"]) for m in api_messages)
-                        total_tokens = input_tokens + output_tokens
                         st.caption(f"💰 ${total_tokens * 0.00075:.4f}")
                     with col4:
-                        st.caption(f"🎯 {work_mode.split()[-1]}")
+                        mode_caption = f"🎯 {work_mode.split()[-1]}"
+                        if response_metrics.get("endpoint"):
+                            mode_caption += f" · 🛰️ {response_metrics['endpoint']}"
+                        st.caption(mode_caption)
                 
                 # Mettre à jour les compteurs
                 st.session_state.session_tokens += total_tokens
                 st.session_state.session_requests += 1
                 
-                # Sauvegarder les stats
-                credits_data['total_tokens'] += total_tokens
-                credits_data['total_requests'] += 1
-                save_credits_usage(credits_data)
+                # Enregistrer la requête dans le registre
+                with trace.span("stats_save"):
+                    usage_ledger.record_request(
+                        mode=mode,
+                        tokens=total_tokens,
+                        input_tokens=input_tokens,
+                        output_tokens=output_tokens,
+                        model=response_metrics.get("endpoint") or LLM_MODEL,
+                        cached=bool(response_metrics.get("cache_hit")),
+                        executions=len(message_data.get("execution_results", [])),
+                        projects=projects_in_turn
+                    )
                 
         except Exception as e:
             error_msg = f"❌ Erreur: {str(e)}"
             message_placeholder.error(error_msg)
             message_data = {"role": "assistant", "content": error_msg}
+            trace.status = "error"
     
     # Ajouter le message à l'historique
-    st.session_state.messages.append(message_data)
+    with trace.span("history_save"):
+        add_message(message_data)
+    trace.finish()
 
 # Guide d'utilisation si pas de messages
 if not st.session_state.messages:
@@ -836,4 +1291,10 @@ st.markdown(
     f"{credits_data.get('projects_created', 0)} projets créés"
     "</div>", 
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+# Temps du script (hors appels au modèle, qui ne mesurent pas l'overhead de l'app)
+script_ms = (time.perf_counter() - SCRIPT_START) * 1000
+startup_stats().setdefault("cold_start_ms", script_ms)
+if not prompt:
+    st.session_state.last_rerun_ms = script_ms
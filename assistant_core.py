@@ -0,0 +1,232 @@
+"""
+Logique partagée entre l'interface Streamlit et le mode batch
+Prompts, extraction du code et des projets, écriture des projets, configuration des endpoints
+"""
+
+import datetime
+import json
+import re
+from pathlib import Path
+
+from project_stream import ProjectStreamParser
+
+DEFAULT_BASE_URL = "https://router.huggingface.co/v1"
+DEFAULT_MODEL = "openai/gpt-oss-120b"  # modèle logique (clé du cache), servi par plusieurs providers
+DEFAULT_ENDPOINTS = "openai/gpt-oss-120b:together,openai/gpt-oss-120b:fireworks-ai,openai/gpt-oss-120b:cerebras"
+
+
+def parse_endpoints(spec, default_base_url=DEFAULT_BASE_URL):
+    """Liste des endpoints configurés (nom, modèle, base_url, variable de la clé API)"""
+    spec = spec.strip()
+    if spec.startswith("["):
+        entries = json.loads(spec)
+    else:
+        entries = [{"model": model.strip()} for model in spec.split(",") if model.strip()]
+
+    endpoints = []
+    for entry in entries:
+        endpoints.append({
+            "name": entry.get("name") or entry["model"],
+            "model": entry["model"],
+            "base_url": entry.get("base_url") or default_base_url,
+            "api_key_env": entry.get("api_key_env") or "HF_TOKEN",
+        })
+    return endpoints
+
+
+def build_router(endpoints, environ, max_connections=20, max_concurrency=8, max_retries=4, deadline=180):
+    """Routeur avec un pipeline de requêtes par base_url (imports lourds différés)"""
+    import model_router
+    import request_pipeline
+
+    pipelines = {}
+    for endpoint in endpoints:
+        if endpoint["base_url"] not in pipelines:
+            pipelines[endpoint["base_url"]] = request_pipeline.RequestPipeline(
+                base_url=endpoint["base_url"],
+                api_key=environ[endpoint["api_key_env"]],
+                max_connections=max_connections,
+                max_keepalive_connections=max_concurrency,
+                max_concurrency=max_concurrency,
+                max_retries=max_retries,
+                deadline=deadline,
+            )
+    return model_router.ModelRouter(endpoints, pipelines)
+
+
+def extract_code_blocks(text, language="python"):
+    """Extrait les blocs de code d'un texte"""
+    pattern = f"```{language}\\s*\\n(.*?)\\n```"
+    matches = re.findall(pattern, text, re.DOTALL)
+    return matches
+
+
+def extract_json_from_text(text):
+    """Extrait le JSON d'un projet d'un texte"""
+    try:
+        # Chercher les blocs ```json (JSON imbriqué supporté)
+        parser = ProjectStreamParser()
+        parser.feed(text)
+        if parser.done:
+            return parser.project
+
+        # Si pas de bloc ```json, chercher du JSON brut contenant "files"
+        files_index = text.find('"files"')
+        if files_index == -1:
+            return None
+
+        decoder = json.JSONDecoder()
+        for match in re.finditer(r'\{', text[:files_index]):
+            try:
+                data, _ = decoder.raw_decode(text, match.start())
+            except ValueError:
+                continue
+            if isinstance(data, dict) and "files" in data:
+                return data
+
+        return None
+    except:
+        return None
+
+
+def new_project_dir(projects_dir, name):
+    """Crée le dossier d'un nouveau projet"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    project_name = (name or 'project').replace(' ', '_').lower()
+    project_name = re.sub(r'[^a-z0-9_]', '', project_name)
+    project_path = Path(projects_dir) / f"{project_name}_{timestamp}"
+    project_path.mkdir(parents=True, exist_ok=True)
+    return project_path
+
+
+def write_project_file(projects_dir, project_path, file_info):
+    """Écrit un fichier du projet, retourne (chemin relatif, taille) ou None"""
+    if not (isinstance(file_info, dict) and 'name' in file_info and 'content' in file_info):
+        return None
+
+    file_path = project_path / file_info['name']
+    # Refuser les chemins qui sortent du dossier du projet
+    if not file_path.resolve().is_relative_to(project_path.resolve()):
+        return None
+
+    # Créer les dossiers nécessaires
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(file_info['content'])
+
+    return str(file_path.relative_to(projects_dir)), len(file_info['content'].encode('utf-8'))
+
+
+def write_project(projects_dir, project_data):
+    """Écrit tous les fichiers d'un projet: retourne (dossier, fichiers créés, taille totale)"""
+    project_path = new_project_dir(projects_dir, project_data.get('name', 'project'))
+
+    created_files = []
+    total_size = 0
+    for file_info in project_data.get('files', []):
+        written = write_project_file(projects_dir, project_path, file_info)
+        if written:
+            created_files.append(written[0])
+            total_size += written[1]
+
+    return project_path, created_files, total_size
+
+
+def create_advanced_prompt(user_message, mode="standard", persistent_kernel=False):
+    """Crée un prompt avancé pour différents types de tâches"""
+
+    if mode == "code_generation":
+        system_prompt = """Tu es un développeur expert capable de créer des applications complètes et fonctionnelles.
+
+CAPACITÉS:
+🔧 Applications web (HTML/CSS/JS, React, Vue)
+📱 Applications mobiles (concepts React Native, Flutter)
+💻 Applications desktop (Electron, Python tkinter)
+🌐 APIs et backends (Python Flask/FastAPI, Node.js)
+📊 Outils d'analyse (Python data science)
+🎮 Jeux web (JavaScript, Canvas)
+
+FORMAT DE RÉPONSE pour projets:
+```json
+{
+  "name": "nom_du_projet",
+  "description": "Description complète",
+  "type": "web/mobile/desktop/api/tool",
+  "files": [
+    {
+      "name": "index.html",
+      "content": "<!DOCTYPE html>...",
+      "description": "Page principale"
+    },
+    {
+      "name": "style.css", 
+      "content": "body { margin: 0; }...",
+      "description": "Styles CSS"
+    }
+  ],
+  "installation": "Instructions détaillées",
+  "usage": "Comment utiliser l'application"
+}
+```
+
+RÈGLES:
+- Toujours fournir du code complet et fonctionnel
+- Inclure tous les fichiers nécessaires
+- Ajouter des commentaires explicatifs
+- Design moderne et responsive
+- Optimisé pour mobile et desktop
+
+Crée cette application:"""
+
+    elif mode == "code_execution":
+        # Kernel persistant: le namespace des tours précédents est encore disponible
+        kernel_rule = (
+            "\n- Les variables des exécutions précédentes de la conversation sont conservées: "
+            "réutilise-les au lieu de tout recalculer"
+            if persistent_kernel else ""
+        )
+        system_prompt = f"""Tu es un expert Python capable d'écrire et d'exécuter du code pour résoudre des problèmes.
+
+CAPACITÉS:
+⚡ Calculs et algorithmes
+📊 Visualisations (matplotlib, plotly si disponible)  
+📈 Analyse de données (pandas, numpy si disponible)
+🧮 Mathématiques et statistiques
+🔍 Traitement de texte et regex
+🎲 Simulations et modélisation
+
+RÈGLES:
+- Écris du code Python complet et exécutable
+- Utilise print() pour afficher les résultats
+- Ajoute des commentaires explicatifs
+- Gère les erreurs potentielles
+- Optimise pour la lisibilité{kernel_rule}
+
+Résous ce problème avec du code Python:"""
+
+    else:  # mode standard
+        system_prompt = """Tu es un assistant IA très avancé avec des capacités complètes de développement.
+
+🎯 CAPACITÉS PRINCIPALES:
+🔧 Développement (web, mobile, desktop, APIs)
+⚡ Exécution et test de code Python
+💡 Résolution de problèmes complexes
+📊 Analyse de données et visualisations
+🎨 Design et interfaces utilisateur
+📝 Rédaction et création de contenu
+🚀 Innovation et brainstorming
+
+STYLE DE RÉPONSE:
+- Réponses détaillées et complètes
+- Explications techniques claires
+- Exemples pratiques
+- Solutions immédiatement utilisables
+- Adaptées au niveau de l'utilisateur
+
+Réponds de manière complète et détaillée:"""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
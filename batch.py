@@ -0,0 +1,278 @@
+"""
+Génération en lot sans interface
+Lit des requêtes JSONL (prompt, mode), les traite en parallèle avec le même post-traitement que l'app
+et écrit les résultats en JSONL; le fichier de résultats sert de point de reprise
+
+Usage: python batch.py prompts.jsonl [-o resultats.jsonl] [-c 4]
+Format d'entrée (une ligne par requête):
+    {"id": "calc", "prompt": "Crée une calculatrice web", "mode": "code_generation"}
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from assistant_core import (
+    DEFAULT_BASE_URL, DEFAULT_ENDPOINTS, DEFAULT_MODEL, build_router, create_advanced_prompt,
+    extract_code_blocks, extract_json_from_text, parse_endpoints, write_project,
+)
+from execution_cache import ExecutionCache, run_cached
+from executor import WorkerPool
+from project_catalog import ProjectCatalog
+from response_cache import ResponseCache, make_cache_key
+from token_counter import count_source, count_tokens, count_message_tokens, usage_to_dict
+from usage_ledger import UsageLedger
+
+MODES = ("standard", "code_execution", "code_generation")
+
+
+def load_items(path):
+    """Requêtes du fichier d'entrée: liste de (id, requête), id = numéro de ligne par défaut"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if item.get("mode", "standard") not in MODES:
+                raise ValueError(f"Ligne {line_number}: mode inconnu {item['mode']!r}")
+            items.append((str(item.get("id", line_number)), item))
+    return items
+
+
+def load_done(results_path, retry_errors=False):
+    """Ids déjà traités d'après le fichier de résultats (reprise après interruption)"""
+    done = set()
+    if not results_path.exists():
+        return done
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # dernière ligne tronquée par une interruption
+            if record.get("status") == "ok" or not retry_errors:
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """Traite une requête de bout en bout: modèle, exécution du code, projet, registre"""
+
+    def __init__(self, router, worker_pool, response_cache, usage_ledger, project_catalog, projects_dir,
+                 temperature=0.8, max_tokens=2500, execution_timeout=30, cpu_timeout=20, use_cache=True,
+                 execution_cache=None, figures_dir=None):
+        self.router = router
+        self.worker_pool = worker_pool
+        self.response_cache = response_cache
+        self.usage_ledger = usage_ledger
+        self.project_catalog = project_catalog
+        self.projects_dir = Path(projects_dir)
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.execution_timeout = execution_timeout
+        self.cpu_timeout = cpu_timeout
+        self.use_cache = use_cache
+        self.execution_cache = execution_cache
+        self.figures_dir = Path(figures_dir) if figures_dir else None
+
+    def _save_figures(self, result):
+        """Écrit les figures d'un résultat en fichiers; le JSONL ne garde que leur chemin"""
+        figures = []
+        for figure in result.get("figures", []):
+            meta = {key: value for key, value in figure.items() if key != "data"}
+            if self.figures_dir is not None:
+                self.figures_dir.mkdir(parents=True, exist_ok=True)
+                path = self.figures_dir / f"{figure['hash']}.{figure['format']}"
+                if not path.exists():
+                    path.write_bytes(figure["data"])
+                meta["path"] = str(path)
+            figures.append(meta)
+        return {**result, "figures": figures} if figures else result
+
+    def run_item(self, item_id, item):
+        """Retourne l'enregistrement de résultat (les erreurs sont rapportées, pas levées)"""
+        mode = item.get("mode", "standard")
+        temperature = item.get("temperature", self.temperature)
+        max_tokens = item.get("max_tokens", self.max_tokens)
+        record = {"id": item_id, "mode": mode}
+        start_time = time.time()
+
+        try:
+            messages = create_advanced_prompt(item["prompt"], mode)
+            cache_key = make_cache_key(DEFAULT_MODEL, messages, temperature, max_tokens)
+            response = self.response_cache.get(cache_key) if self.use_cache else None
+            usage = None
+
+            if response is not None:
+                record["cache_hit"] = True
+            else:
+                completion, endpoint = self.router.complete(
+                    mode, messages=messages, max_tokens=max_tokens, temperature=temperature
+                )
+                response = completion.choices[0].message.content or ""
+                usage = usage_to_dict(completion.usage)
+                record["endpoint"] = endpoint
+                if self.use_cache and response:
+                    self.response_cache.set(cache_key, response)
+            record["response_time"] = round(time.time() - start_time, 2)
+
+            # Même post-traitement que l'interface
+            execution_results = []
+            if (mode == "code_execution" or item.get("execute")) and "```python" in response:
+                code_blocks = [code.strip() for code in extract_code_blocks(response, "python")]
+                execution_results = [None] * len(code_blocks)
+                for i, result in run_cached(
+                    self.worker_pool, self.execution_cache, code_blocks,
+                    timeout=self.execution_timeout, cpu_timeout=self.cpu_timeout
+                ):
+                    execution_results[i] = self._save_figures(result)
+                record["execution_results"] = execution_results
+
+            projects = 0
+            if mode == "code_generation" and item.get("create_project", True):
+                project_data = extract_json_from_text(response)
+                if project_data and "files" in project_data:
+                    project_path, created_files, total_size = write_project(self.projects_dir, project_data)
+                    self.project_catalog.add(
+                        project_path,
+                        description=project_data.get("description", ""),
+                        file_count=len(created_files),
+                        total_size=total_size,
+                    )
+                    record["project"] = {
+                        "name": project_data.get("name", "Projet"),
+                        "path": str(project_path.relative_to(self.projects_dir)),
+                        "files": created_files,
+                    }
+                    projects = 1
+
+            if usage:
+                input_tokens, output_tokens = usage["prompt_tokens"], usage["completion_tokens"]
+            else:
+                input_tokens, output_tokens = count_message_tokens(messages), count_tokens(response)
+            total_tokens = 0 if record.get("cache_hit") else input_tokens + output_tokens
+            record["tokens"] = {
+                "input": input_tokens,
+                "output": output_tokens,
+                "source": "usage" if usage else count_source(),
+            }
+
+            self.usage_ledger.record_request(
+                mode=mode,
+                tokens=total_tokens,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                model=record.get("endpoint") or DEFAULT_MODEL,
+                cached=bool(record.get("cache_hit")),
+                executions=len(execution_results),
+                projects=projects,
+            )
+            record["response"] = response
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+
+        record["latency"] = round(time.time() - start_time, 2)
+        record["finished_at"] = datetime.datetime.now().isoformat()
+        return record
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Génération en lot (prompts JSONL -> résultats JSONL)")
+    parser.add_argument("input", type=Path, help="fichier JSONL des requêtes")
+    parser.add_argument("-o", "--output", type=Path, help="fichier JSONL des résultats (défaut: <input>.results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", 4)),
+                        help="requêtes traitées en parallèle")
+    parser.add_argument("--temperature", type=float, default=0.8)
+    parser.add_argument("--max-tokens", type=int, default=2500)
+    parser.add_argument("--no-cache", action="store_true", help="ne pas utiliser le cache des réponses")
+    parser.add_argument("--retry-errors", action="store_true", help="retraiter les requêtes en erreur à la reprise")
+    parser.add_argument("--projects-dir", type=Path, default=Path("generated_projects"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv()
+    output = args.output or args.input.with_suffix(".results.jsonl")
+
+    items = load_items(args.input)
+    done = load_done(output, args.retry_errors)
+    pending = [(item_id, item) for item_id, item in items if item_id not in done]
+    print(f"{len(items)} requêtes, {len(items) - len(pending)} déjà traitées, {len(pending)} à traiter", file=sys.stderr)
+    if not pending:
+        return 0
+
+    args.projects_dir.mkdir(exist_ok=True)
+    router = build_router(
+        parse_endpoints(os.environ.get("LLM_ENDPOINTS", DEFAULT_ENDPOINTS),
+                        os.environ.get("LLM_BASE_URL", DEFAULT_BASE_URL)),
+        os.environ,
+        max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", 20)),
+        max_concurrency=args.concurrency,
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", 4)),
+        deadline=float(os.environ.get("LLM_DEADLINE", 180)),
+    )
+    worker_pool = WorkerPool(
+        size=int(os.environ.get("EXECUTION_WORKERS", 4)),
+        figure_options={
+            "image_format": os.environ.get("FIGURE_FORMAT", "webp"),
+            "dpi": int(os.environ.get("FIGURE_DPI", 100)),
+            "max_size": int(os.environ.get("FIGURE_MAX_SIZE", 1280)),
+        },
+    )
+    runner = BatchRunner(
+        router,
+        worker_pool,
+        ResponseCache(Path("response_cache.db")),
+        UsageLedger(Path("usage_ledger.db"), legacy_json=Path("credits_usage.json")),
+        ProjectCatalog(Path("projects_catalog.db"), args.projects_dir),
+        args.projects_dir,
+        temperature=args.temperature,
+        max_tokens=args.max_tokens,
+        execution_timeout=float(os.environ.get("EXECUTION_TIMEOUT", 30)),
+        cpu_timeout=int(os.environ.get("EXECUTION_CPU_TIMEOUT", 20)),
+        use_cache=not args.no_cache,
+        execution_cache=None if args.no_cache else ExecutionCache(),
+        figures_dir=output.with_name(output.stem + "_figures"),
+    )
+
+    errors = 0
+    executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        with open(output, "a", encoding="utf-8") as results:
+            futures = [executor.submit(runner.run_item, item_id, item) for item_id, item in pending]
+            for completed, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                # Une ligne par requête terminée: c'est le point de reprise
+                results.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                results.flush()
+                errors += record["status"] != "ok"
+                print(f"[{completed}/{len(pending)}] {record['id']} {record['status']} {record['latency']}s",
+                      file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrompu: relancer la même commande pour reprendre", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        worker_pool.shutdown()
+
+    print(f"Terminé: {len(pending) - errors} ok, {errors} en erreur -> {output}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
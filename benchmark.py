@@ -0,0 +1,226 @@
+"""
+Benchmarks des chemins critiques de l'app, modèle remplacé par le serveur local (stub_server)
+Mesure le coût propre de l'app (exécution, extraction, projets, ZIP, registre, tour de chat complet)
+et écrit les résultats en JSON; comparaison optionnelle avec une référence pour détecter les régressions
+
+Usage: python benchmark.py [-o bench.json] [--baseline reference.json] [--max-regression 1.25] [--quick]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import assistant_core
+import project_archive
+from executor import WorkerPool
+from project_catalog import ProjectCatalog
+from stub_server import EXECUTION_RESPONSE, PROJECT_RESPONSE, StubServer, project_response
+from usage_ledger import UsageLedger
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+
+# Différences absolues sous ce seuil ignorées (bruit de mesure)
+MIN_REGRESSION_MS = 1.0
+
+
+def summarize(durations):
+    """Statistiques d'une série de durées en ms (min, p50, p95, moyenne, max)"""
+    durations = sorted(durations)
+    return {
+        "iterations": len(durations),
+        "min_ms": round(durations[0], 3),
+        "p50_ms": round(statistics.median(durations), 3),
+        "p95_ms": round(durations[min(len(durations) - 1, int(0.95 * len(durations)))], 3),
+        "mean_ms": round(statistics.fmean(durations), 3),
+        "max_ms": round(durations[-1], 3),
+    }
+
+
+def measure(fn, iterations, warmup=1):
+    """Durées d'exécution de `fn` en ms"""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return summarize(durations)
+
+
+def bench_execution(results, iterations):
+    # Le bac à sable n'autorise pas `import` (modules pré-injectés)
+    pool = WorkerPool(size=2)
+
+    def run(code):
+        result = pool.run(code, timeout=30, cpu_timeout=20)
+        if not result["success"]:
+            raise RuntimeError(f"Exécution en échec: {result['error']}")
+
+    try:
+        results["execute_python_code.print"] = measure(lambda: run("print(sum(range(1000)))"), iterations)
+        results["execute_python_code.loop"] = measure(
+            lambda: run("print(sum(i * i for i in range(200000)))"), iterations
+        )
+    finally:
+        pool.shutdown()
+
+
+def bench_extraction(results, iterations):
+    long_text = EXECUTION_RESPONSE * 20
+    large_project = project_response(file_count=100, file_size=4000)
+    results["extract_code_blocks"] = measure(lambda: assistant_core.extract_code_blocks(long_text), iterations)
+    results["extract_json_from_text"] = measure(lambda: assistant_core.extract_json_from_text(PROJECT_RESPONSE), iterations)
+    results["extract_json_from_text.large"] = measure(
+        lambda: assistant_core.extract_json_from_text(large_project), iterations
+    )
+
+
+def bench_projects(results, iterations, workdir):
+    projects_dir = workdir / "generated_projects"
+    projects_dir.mkdir(exist_ok=True)
+    catalog = ProjectCatalog(workdir / "projects_catalog.db", projects_dir)
+    project_data = assistant_core.extract_json_from_text(PROJECT_RESPONSE)
+
+    def create_project_structure():
+        project_path, created_files, total_size = assistant_core.write_project(projects_dir, project_data)
+        catalog.add(project_path, project_data.get("description", ""), len(created_files), total_size)
+        return project_path
+
+    results["create_project_structure"] = measure(create_project_structure, iterations)
+
+    project_path = create_project_structure()
+    results["create_download_zip.cold"] = measure(
+        lambda: (project_archive.project_content_hash(project_path), project_archive.build_zip_bytes(project_path)),
+        iterations,
+    )
+    # Archive déjà en cache: seul le hash du contenu est recalculé
+    results["create_download_zip.cached"] = measure(
+        lambda: project_archive.project_content_hash(project_path), iterations
+    )
+
+
+def bench_ledger(results, iterations, workdir):
+    # Remplace l'ancien save_credits_usage (réécriture complète du JSON)
+    ledger = UsageLedger(workdir / "usage_ledger.db")
+    results["usage_ledger.record_request"] = measure(
+        lambda: ledger.record_request(mode="standard", tokens=1200, input_tokens=800, output_tokens=400,
+                                      model="stub", executions=1),
+        iterations,
+    )
+
+
+def bench_chat_turns(results, iterations, stub):
+    """Tour de chat complet via l'interface de test de Streamlit (rerun compris)"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(HF_TOKEN="stub", LLM_BASE_URL=stub.base_url, LLM_ENDPOINTS="stub")
+    scenarios = {
+        "chat_turn.standard": "💬 Chat Standard",
+        "chat_turn.code_execution": "⚡ Exécution Python",
+        "chat_turn.code_generation": "🔧 Génération de Code",
+    }
+    for name, work_mode in scenarios.items():
+        durations = []
+        errors = 0
+        # Premier tour non mesuré: démarrage du pool de workers et du client
+        for i in range(iterations + 1):
+            at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+            at.run()
+            at.sidebar.selectbox[0].set_value(work_mode).run()
+            # Prompt unique: pas de réponse en cache; seul le rerun du tour est chronométré
+            at.chat_input[0].set_value(f"Benchmark {name} #{i}")
+            start = time.perf_counter()
+            at.run()
+            if i:
+                durations.append((time.perf_counter() - start) * 1000)
+                errors += bool(at.exception or at.error)
+
+        results[name] = summarize(durations)
+        results[name]["errors"] = errors
+
+
+def compare(results, baseline, max_regression):
+    """Benchmarks dont le p50 dépasse la référence de plus du facteur autorisé"""
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        ratio = stats["p50_ms"] / reference["p50_ms"] if reference["p50_ms"] else float("inf")
+        if ratio > max_regression and stats["p50_ms"] - reference["p50_ms"] > MIN_REGRESSION_MS:
+            regressions.append({
+                "name": name,
+                "baseline_p50_ms": reference["p50_ms"],
+                "p50_ms": stats["p50_ms"],
+                "ratio": round(ratio, 2),
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins critiques (sortie JSON)")
+    parser.add_argument("-o", "--output", type=Path, help="fichier JSON des résultats (défaut: stdout)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--chat-iterations", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="moins d'itérations (vérification rapide)")
+    parser.add_argument("--skip-chat", action="store_true", help="ne pas mesurer les tours de chat complets")
+    parser.add_argument("--ttft", type=float, default=0.05, help="TTFT simulé par le stub (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="débit simulé par le stub")
+    parser.add_argument("--baseline", type=Path, help="résultats de référence à comparer")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="facteur maximal sur le p50")
+    args = parser.parse_args(argv)
+
+    iterations = 5 if args.quick else args.iterations
+    chat_iterations = 2 if args.quick else args.chat_iterations
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp, \
+            StubServer(ttft=args.ttft, tokens_per_second=args.tokens_per_second) as stub:
+        workdir = Path(tmp)
+        cwd = os.getcwd()
+        os.chdir(workdir)  # l'app écrit ses fichiers dans le dossier courant
+        try:
+            bench_extraction(results, iterations)
+            bench_ledger(results, iterations, workdir)
+            bench_projects(results, iterations, workdir)
+            bench_execution(results, iterations)
+            if not args.skip_chat:
+                bench_chat_turns(results, chat_iterations, stub)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub": {"ttft": args.ttft, "tokens_per_second": args.tokens_per_second},
+        },
+        "results": results,
+    }
+    if args.baseline:
+        report["regressions"] = compare(results, json.loads(args.baseline.read_text()), args.max_regression)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print(f"Régression: {regression['name']} x{regression['ratio']} "
+                  f"({regression['baseline_p50_ms']} -> {regression['p50_ms']} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
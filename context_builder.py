@@ -0,0 +1,74 @@
+"""
+Construction du contexte envoyé au modèle
+Remplit un budget de tokens: tours récents en entier, tours plus anciens résumés (résumés mis en cache)
+"""
+
+import functools
+import re
+
+from token_counter import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+CODE_BLOCK_PATTERN = re.compile(r"```(\w*)\s*\n(.*?)```", re.DOTALL)
+SUMMARY_MAX_CHARS = 300
+
+
+@functools.lru_cache(maxsize=4096)
+def summarize_message(content):
+    """Résumé extractif d'un message: blocs de code remplacés par un marqueur, texte tronqué"""
+    def _code_marker(match):
+        language = match.group(1) or "code"
+        lines = match.group(2).rstrip("\n").count("\n") + 1
+        return f" [bloc {language}: {lines} lignes] "
+
+    text = CODE_BLOCK_PATTERN.sub(_code_marker, content)
+    text = " ".join(text.split())
+
+    if len(text) <= SUMMARY_MAX_CHARS:
+        return text
+
+    # Couper sur une fin de phrase si possible
+    cut = text[:SUMMARY_MAX_CHARS]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end > SUMMARY_MAX_CHARS // 2:
+        cut = cut[:sentence_end + 1]
+    return cut.rstrip() + " […]"
+
+
+def _message_cost(content):
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_context(prompt_messages, history, token_budget):
+    """Assemble [system] + historique + [user] dans la limite de `token_budget` tokens.
+
+    `prompt_messages` vient de create_advanced_prompt (system puis user) et reste un préfixe stable.
+    Les tours les plus récents sont gardés en entier; dès qu'un tour ne tient plus,
+    les tours plus anciens sont remplacés par leur résumé, jusqu'à épuisement du budget.
+    """
+    system_messages = prompt_messages[:-1]
+    user_message = prompt_messages[-1]
+
+    used = sum(_message_cost(m["content"]) for m in prompt_messages)
+    selected = []
+    summarizing = False
+
+    for message in reversed(history):
+        content = message["content"]
+
+        if not summarizing:
+            cost = _message_cost(content)
+            if used + cost <= token_budget:
+                selected.append({"role": message["role"], "content": content})
+                used += cost
+                continue
+            summarizing = True
+
+        summary = summarize_message(content)
+        cost = _message_cost(summary)
+        if used + cost > token_budget:
+            break
+        selected.append({"role": message["role"], "content": summary})
+        used += cost
+
+    selected.reverse()
+    return system_messages + selected + [user_message]
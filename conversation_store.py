@@ -0,0 +1,207 @@
+"""
+Stockage des conversations
+Un fichier JSONL par conversation (ajout en fin de fichier) + index SQLite des conversations
+Figures des exécutions stockées à part, une seule fois par contenu (nom = hash)
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def _read_lines_before(path, end_offset, count):
+    """Lit les `count` dernières lignes avant `end_offset` en remontant depuis la fin du fichier.
+
+    Retourne (lignes, offset de la première ligne retournée).
+    """
+    with open(path, 'rb') as f:
+        if end_offset is None:
+            f.seek(0, 2)
+            end_offset = f.tell()
+
+        position = end_offset
+        buffer = b''
+        # count + 1 sauts de ligne garantissent `count` lignes complètes
+        while position > 0 and buffer.count(b'\n') <= count:
+            size = min(READ_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            buffer = f.read(size) + buffer
+
+    lines = buffer.split(b'\n')
+    if lines and lines[-1] == b'':
+        lines.pop()
+    if position > 0:
+        lines.pop(0)  # ligne tronquée au début du buffer
+
+    selected = lines[-count:] if count else []
+    start_offset = end_offset - sum(len(line) + 1 for line in selected)
+    return selected, start_offset
+
+
+class ConversationStore:
+    """Conversations persistées sur disque, chargées page par page"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.figures_dir = self.root / "figures"
+        self.figures_dir.mkdir(exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.db"), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                owner TEXT
+            )"""
+        )
+        # Index créé avant l'ajout du propriétaire: ces conversations ne sont plus listées pour personne
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE conversations ADD COLUMN owner TEXT")
+        self._conn.execute("DROP INDEX IF EXISTS idx_conversations_updated")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_owner ON conversations(owner, updated_at)")
+        self._conn.commit()
+
+    def _path(self, conversation_id):
+        return self.root / f"{conversation_id}.jsonl"
+
+    def create(self, title, owner):
+        """Crée une nouvelle conversation appartenant à `owner` et retourne son identifiant"""
+        conversation_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:8]
+        now = datetime.datetime.now().isoformat()
+        title = " ".join(title.split())
+        title = title[:57] + "..." if len(title) > 60 else title
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversations (id, title, created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, title or "Conversation", now, now, owner),
+            )
+        self._path(conversation_id).touch()
+        return conversation_id
+
+    def append(self, conversation_id, message, tokens=0):
+        """Ajoute un message en fin de conversation (sans réécrire le fichier)"""
+        line = json.dumps(message, ensure_ascii=False, default=str) + "\n"
+
+        with self._lock:
+            with open(self._path(conversation_id), 'a', encoding='utf-8') as f:
+                f.write(line)
+            with self._conn:
+                self._conn.execute(
+                    """UPDATE conversations
+                       SET updated_at = ?, message_count = message_count + 1, tokens = tokens + ?
+                       WHERE id = ?""",
+                    (datetime.datetime.now().isoformat(), tokens, conversation_id),
+                )
+
+    def remove_last(self, conversation_id, count):
+        """Retire les `count` derniers messages (fichier tronqué, pas réécrit)"""
+        path = self._path(conversation_id)
+        with self._lock:
+            lines, start_offset = _read_lines_before(path, None, count)
+            tokens = 0
+            for line in lines:
+                try:
+                    message_tokens = json.loads(line).get("tokens", {})
+                except ValueError:
+                    continue
+                tokens += message_tokens.get("input", 0) + message_tokens.get("output", 0)
+            with open(path, 'r+b') as f:
+                f.truncate(start_offset)
+            with self._conn:
+                self._conn.execute(
+                    """UPDATE conversations
+                       SET updated_at = ?, message_count = max(0, message_count - ?), tokens = max(0, tokens - ?)
+                       WHERE id = ?""",
+                    (datetime.datetime.now().isoformat(), len(lines), tokens, conversation_id),
+                )
+
+    def _figure_path(self, content_hash, image_format):
+        return self.figures_dir / f"{content_hash}.{image_format}"
+
+    def save_figure(self, content_hash, image_format, data):
+        """Écrit une figure si son contenu n'est pas déjà stocké"""
+        path = self._figure_path(content_hash, image_format)
+        if path.exists():
+            return
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def load_figure(self, content_hash, image_format):
+        """Octets d'une figure stockée, None si elle a disparu"""
+        try:
+            return self._figure_path(content_hash, image_format).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def externalize_figures(self, message):
+        """Écrit les figures des résultats d'exécution et retourne le message sans leurs octets"""
+        results = message.get("execution_results")
+        if not results or not any(result and result.get("figures") for result in results):
+            return message
+
+        stripped = []
+        for result in results:
+            if result and result.get("figures"):
+                figures = []
+                for figure in result["figures"]:
+                    if "data" in figure:
+                        self.save_figure(figure["hash"], figure["format"], figure["data"])
+                    figures.append({key: value for key, value in figure.items() if key != "data"})
+                # Copie: le résultat peut être partagé avec le cache d'exécution
+                result = {**result, "figures": figures}
+            stripped.append(result)
+        return {**message, "execution_results": stripped}
+
+    def list(self, owner, limit=10):
+        """Conversations de `owner` les plus récemment modifiées"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT id, title, updated_at, message_count, tokens
+                   FROM conversations WHERE owner = ? ORDER BY updated_at DESC LIMIT ?""",
+                (owner, limit),
+            ).fetchall()
+        return [
+            {"id": cid, "title": title, "updated_at": updated_at, "message_count": count, "tokens": tokens}
+            for cid, title, updated_at, count, tokens in rows
+        ]
+
+    def is_owner(self, conversation_id, owner):
+        """La conversation existe et appartient à `owner`"""
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row is not None and owner is not None and row[0] == owner
+
+    def load_page(self, conversation_id, limit=20, before=None):
+        """Charge jusqu'à `limit` messages avant le curseur `before` (None = fin de la conversation).
+
+        Retourne (messages, curseur vers la page précédente ou None si tout est chargé).
+        """
+        path = self._path(conversation_id)
+        if not path.exists():
+            return [], None
+
+        lines, start_offset = _read_lines_before(path, before, limit)
+        messages = []
+        for line in lines:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue  # ligne incomplète (écriture interrompue)
+
+        return messages, (start_offset if start_offset > 0 else None)
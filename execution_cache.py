@@ -0,0 +1,167 @@
+"""
+Cache des résultats d'exécution
+Clé: hash du code normalisé (AST, sans commentaires ni mise en forme) + empreinte de l'environnement
+Le code non déterministe (random, time, uuid...) n'est jamais mis en cache
+"""
+
+import ast
+import hashlib
+import importlib.metadata
+import json
+import platform
+import threading
+from collections import OrderedDict
+
+# Modules dont la version change le résultat d'une exécution
+FINGERPRINT_PACKAGES = ("numpy", "pandas", "matplotlib")
+
+# Le bac à sable ne fixe aucune graine: tout usage d'aléatoire ou d'horloge rend le code non déterministe
+SEED_POLICY = "unseeded"
+NONDETERMINISTIC_NAMES = {"random", "time", "datetime", "uuid", "secrets", "os", "perf_counter"}
+NONDETERMINISTIC_ATTRIBUTES = {"random", "now", "today", "utcnow", "time", "perf_counter", "monotonic",
+                               "rand", "randn", "randint", "choice", "shuffle", "default_rng", "urandom"}
+
+# Marqueur explicite pour désactiver le cache sur un bloc
+NO_CACHE_MARKER = "# no-cache"
+
+
+def environment_fingerprint(extra=None):
+    """Empreinte de l'environnement d'exécution (Python, versions des paquets, politique de graine)"""
+    versions = {}
+    for package in FINGERPRINT_PACKAGES:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    payload = {
+        "python": platform.python_version(),
+        "packages": versions,
+        "seed_policy": SEED_POLICY,
+        **(extra or {}),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def normalize_code(code):
+    """Forme canonique du code: AST si le code est valide, sinon lignes nettoyées"""
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        lines = (line.rstrip() for line in code.replace("\r\n", "\n").split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+def is_deterministic(code):
+    """Faux si le code utilise l'aléatoire ou l'horloge (ou porte le marqueur # no-cache)"""
+    if NO_CACHE_MARKER in code:
+        return False
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return True  # l'erreur de syntaxe, elle, est reproductible
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_NAMES:
+            return False
+        if isinstance(node, ast.Attribute) and node.attr in NONDETERMINISTIC_ATTRIBUTES:
+            return False
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [alias.name for alias in node.names] + [getattr(node, "module", None) or ""]
+            if any(module.split(".")[0] in NONDETERMINISTIC_NAMES for module in modules):
+                return False
+    return True
+
+
+def _result_size(result):
+    figures = result.get("figures") or []
+    text = {**result, "figures": [{k: v for k, v in figure.items() if k != "data"} for figure in figures]}
+    return len(json.dumps(text, default=str)) + sum(len(figure.get("data") or b"") for figure in figures)
+
+
+class ExecutionCache:
+    """LRU en mémoire partagé par les sessions, borné en nombre d'entrées et en octets"""
+
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024, fingerprint=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint or environment_fingerprint()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (résultat, taille)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0  # code non déterministe
+
+    def key_for(self, code):
+        """Clé de cache du code, None s'il ne doit pas être mis en cache"""
+        if not is_deterministic(code):
+            with self._lock:
+                self.skipped += 1
+            return None
+        digest = hashlib.sha256()
+        digest.update(self.fingerprint.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalize_code(code).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Copie du résultat en cache (marquée `cache_hit`) ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {**entry[0], "cache_hit": True}
+
+    def set(self, key, result):
+        """Enregistre un résultat réussi (les échecs peuvent venir de la charge: timeout, worker)"""
+        if not result.get("success"):
+            return
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (dict(result), size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def run_cached(pool, cache, codes, timeout=None, cpu_timeout=None, on_output=None, session_id=None, on_queue=None):
+    """Comme `pool.run_many`, en servant depuis le cache les blocs déjà exécutés"""
+    keys = [cache.key_for(code) if cache is not None else None for code in codes]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            yield i, cached
+        else:
+            pending.append(i)
+
+    def relay(callback):
+        return None if callback is None else (lambda j, value: callback(pending[j], value))
+
+    runs = pool.run_many(
+        [codes[i] for i in pending], timeout=timeout, cpu_timeout=cpu_timeout,
+        on_output=relay(on_output), session_id=session_id, on_queue=relay(on_queue),
+    )
+    for j, result in runs:
+        i = pending[j]
+        if keys[i] is not None:
+            cache.set(keys[i], result)
+        yield i, result
@@ -0,0 +1,168 @@
+"""
+Sortie des exécutions
+Tampon borné (début + fin, avec marqueur d'élision), envoi de la sortie au fil de l'eau par paquets
+et résumé des DataFrames / tableaux NumPy volumineux passés à print()
+"""
+
+import io
+import os
+import sys
+import time
+
+HEAD_CHARS = int(os.environ.get("EXECUTION_OUTPUT_HEAD_CHARS", 20_000))  # début de sortie conservé
+TAIL_CHARS = int(os.environ.get("EXECUTION_OUTPUT_TAIL_CHARS", 20_000))  # fin de sortie conservée
+STREAM_INTERVAL = 0.25  # secondes minimum entre deux paquets envoyés
+STREAM_CHUNK_CHARS = 8_000  # taille maximale d'un paquet (seule la fin est envoyée au-delà)
+BATCH_CHARS = 8_192  # écritures regroupées avant répartition dans les tampons
+
+# Résumé des valeurs volumineuses
+SUMMARY_MAX_ROWS = 20
+SUMMARY_MAX_COLUMNS = 12
+SUMMARY_MAX_ITEMS = 200
+
+
+def elision_marker(count):
+    return f"\n... [{count:,} caractères omis] ...\n"
+
+
+class BoundedOutput(io.TextIOBase):
+    """Flux texte à mémoire bornée: garde le début et la fin, compte ce qui est omis entre les deux.
+
+    `on_chunk(texte)` reçoit la sortie récente au plus toutes les `interval` secondes.
+    """
+
+    def __init__(self, head_chars=HEAD_CHARS, tail_chars=TAIL_CHARS, on_chunk=None,
+                 interval=STREAM_INTERVAL, chunk_chars=STREAM_CHUNK_CHARS):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.on_chunk = on_chunk
+        self.interval = interval
+        self.chunk_chars = chunk_chars
+        # Écritures récentes, réparties par lots (write() reste un simple ajout)
+        self._recent = []
+        self._recent_size = 0
+        self._head = []
+        self._head_size = 0
+        # Fin et paquet en cours: compactés seulement au double de leur limite
+        self._tail = []
+        self._tail_size = 0
+        self._elided = 0
+        self._pending = []
+        self._pending_size = 0
+        self._pending_skipped = 0
+        self._last_flush = 0.0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        self._recent.append(text)
+        self._recent_size += len(text)
+        if self._recent_size >= BATCH_CHARS:
+            self._drain()
+        if self.on_chunk is not None and time.monotonic() - self._last_flush >= self.interval:
+            self.flush_chunk()
+        return len(text)
+
+    def _drain(self):
+        """Répartit les écritures récentes entre le début, la fin et le paquet à envoyer"""
+        if not self._recent:
+            return
+        text = "".join(self._recent)
+        self._recent = []
+        self._recent_size = 0
+
+        rest = text
+        if self._head_size < self.head_chars:
+            taken = rest[:self.head_chars - self._head_size]
+            self._head.append(taken)
+            self._head_size += len(taken)
+            rest = rest[len(taken):]
+        if rest:
+            self._tail.append(rest)
+            self._tail_size += len(rest)
+            if self._tail_size > 2 * self.tail_chars:
+                self._elided += self._compact_tail()
+
+        if self.on_chunk is not None:
+            self._pending.append(text)
+            self._pending_size += len(text)
+            if self._pending_size > 2 * self.chunk_chars:
+                self._pending_skipped += self._compact_pending()
+
+    @staticmethod
+    def _keep_end(parts, size, limit):
+        """Ne garde que les `limit` derniers caractères de `parts`, retourne le nombre retiré"""
+        if size <= limit:
+            return 0
+        text = "".join(parts)
+        parts[:] = [text[len(text) - limit:]] if limit else []
+        return size - limit
+
+    def _compact_tail(self):
+        removed = self._keep_end(self._tail, self._tail_size, self.tail_chars)
+        self._tail_size -= removed
+        return removed
+
+    def _compact_pending(self):
+        removed = self._keep_end(self._pending, self._pending_size, self.chunk_chars)
+        self._pending_size -= removed
+        return removed
+
+    def flush_chunk(self):
+        """Envoie la sortie accumulée depuis le dernier paquet"""
+        self._last_flush = time.monotonic()
+        self._drain()
+        if self.on_chunk is None or not self._pending:
+            return
+        self._pending_skipped += self._compact_pending()
+        chunk = "".join(self._pending)
+        if self._pending_skipped:
+            chunk = elision_marker(self._pending_skipped).lstrip("\n") + chunk
+        self._pending = []
+        self._pending_size = 0
+        self._pending_skipped = 0
+        self.on_chunk(chunk)
+
+    def getvalue(self):
+        self._drain()
+        self._elided += self._compact_tail()
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        return head + elision_marker(self._elided) + tail if self._elided else head + tail
+
+
+def summarize_value(value):
+    """Version compacte d'un DataFrame / Series / ndarray volumineux, les autres valeurs sont inchangées"""
+    module = type(value).__module__ or ""
+    shape = getattr(value, "shape", None)
+    if shape is None:
+        return value
+
+    try:
+        # DataFrame / Series seulement: Index, Categorical... n'ont pas de to_string(max_rows=...)
+        if module.startswith("pandas") and type(value).__name__ in ("DataFrame", "Series"):
+            rows = shape[0]
+            columns = shape[1] if len(shape) > 1 else 1
+            if rows <= SUMMARY_MAX_ROWS and columns <= SUMMARY_MAX_COLUMNS:
+                return value
+            if len(shape) > 1:
+                text = value.to_string(max_rows=SUMMARY_MAX_ROWS, max_cols=SUMMARY_MAX_COLUMNS)
+            else:
+                text = value.to_string(max_rows=SUMMARY_MAX_ROWS)
+            return f"{text}\n[{type(value).__name__}: {rows:,} lignes × {columns:,} colonnes]"
+
+        if module == "numpy" and getattr(value, "size", 0) > SUMMARY_MAX_ITEMS:
+            numpy = sys.modules["numpy"]
+            text = numpy.array2string(value, threshold=SUMMARY_MAX_ITEMS, edgeitems=3)
+            return f"{text}\n[ndarray: shape={shape}, dtype={value.dtype}]"
+    except Exception:
+        pass  # le résumé ne doit jamais faire échouer print()
+    return value
+
+
+def summarizing_print(*args, **kwargs):
+    """print() qui résume les DataFrames et tableaux volumineux"""
+    print(*(summarize_value(arg) for arg in args), **kwargs)
@@ -0,0 +1,740 @@
+"""
+Exécution de code Python dans des workers isolés
+Pool de processus pré-démarrés avec la stack scientifique déjà importée
+"""
+
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import multiprocessing.spawn
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from execution_output import BoundedOutput, summarizing_print
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ExecutionTimeout(BaseException):
+    """Temps CPU dépassé (BaseException: ne peut pas être avalée par un `except Exception`)"""
+
+
+def build_safe_globals():
+    """Crée un namespace sécurisé pour l'exécution"""
+    safe_globals = {
+        '__builtins__': {
+            'print': summarizing_print,
+            'len': len,
+            'range': range,
+            'list': list,
+            'dict': dict,
+            'str': str,
+            'int': int,
+            'float': float,
+            'bool': bool,
+            'sum': sum,
+            'max': max,
+            'min': min,
+            'sorted': sorted,
+            'enumerate': enumerate,
+            'zip': zip,
+            'map': map,
+            'filter': filter,
+            'abs': abs,
+            'round': round,
+            'type': type,
+            'isinstance': isinstance,
+        }
+    }
+
+    # Ajouter des modules utiles
+    try:
+        safe_globals['math'] = __import__('math')
+        safe_globals['datetime'] = __import__('datetime')
+        safe_globals['json'] = __import__('json')
+        safe_globals['random'] = __import__('random')
+        safe_globals['time'] = __import__('time')
+        safe_globals['re'] = __import__('re')
+    except:
+        pass
+
+    return safe_globals
+
+
+def prewarm_modules():
+    """Importe la stack data science une seule fois (matplotlib en backend Agg)"""
+    modules = {}
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')  # Backend non-interactif
+        import matplotlib.pyplot as plt
+        modules['plt'] = plt
+        modules['matplotlib'] = matplotlib
+    except:
+        pass
+
+    try:
+        import numpy as np
+        modules['np'] = np
+        modules['numpy'] = np
+    except:
+        pass
+
+    try:
+        import pandas as pd
+        modules['pd'] = pd
+        modules['pandas'] = pd
+    except:
+        pass
+
+    return modules
+
+
+def run_code(code, safe_globals, on_chunk=None):
+    """Exécute le code dans le namespace donné en capturant stdout et stderr (mémoire bornée)"""
+    captured_output = BoundedOutput(on_chunk=on_chunk)
+    captured_error = BoundedOutput()
+
+    try:
+        with contextlib.redirect_stdout(captured_output), contextlib.redirect_stderr(captured_error):
+            exec(code, safe_globals)
+
+        error = captured_error.getvalue()
+        return {
+            'success': True,
+            'output': captured_output.getvalue(),
+            'error': error if error else None
+        }
+    except ExecutionTimeout as e:
+        return {
+            'success': False,
+            'output': captured_output.getvalue(),
+            'error': str(e),
+            'cpu_exceeded': True
+        }
+    except MemoryError:
+        return {
+            'success': False,
+            'output': captured_output.getvalue(),
+            'error': "Mémoire insuffisante (MemoryError)",
+            'out_of_memory': True
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'output': captured_output.getvalue(),
+            'error': str(e) + '\n' + traceback.format_exc()
+        }
+
+
+def _encode_figure(figure, image_format, dpi, max_size, quality):
+    """Rend la figure en pixels puis l'encode une seule fois; retourne (octets, largeur, hauteur, format)"""
+    buffer = io.BytesIO()
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow absent: PNG direct, sans réduction
+        figure.savefig(buffer, format="png", dpi=dpi)
+        width, height = (figure.get_size_inches() * dpi).astype(int)
+        return buffer.getvalue(), int(width), int(height), "png"
+
+    figure.set_dpi(dpi)
+    figure.canvas.draw()
+    rgba = figure.canvas.buffer_rgba()
+    height, width = rgba.shape[:2]
+    image = Image.frombuffer("RGBA", (width, height), bytes(rgba), "raw", "RGBA", 0, 1)
+    if max_size and max(width, height) > max_size:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    if image_format == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image_format = "png"
+        image.save(buffer, format="PNG")
+    return buffer.getvalue(), image.width, image.height, image_format
+
+
+def capture_figures(plt, image_format="webp", dpi=100, max_size=1280, max_figures=8, quality=85):
+    """Encode les figures matplotlib ouvertes après une exécution (PNG ou WebP)"""
+    figures = []
+    for number in plt.get_fignums()[:max_figures]:
+        try:
+            data, width, height, encoded_format = _encode_figure(
+                plt.figure(number), image_format, dpi, max_size, quality
+            )
+        except Exception:
+            continue  # figure invalide: ne pas faire échouer l'exécution
+        figures.append({
+            "hash": hashlib.sha256(data).hexdigest(),
+            "format": encoded_format,
+            "width": width,
+            "height": height,
+            "data": data,
+        })
+    return figures
+
+
+def _memory_usage_mb():
+    if resource is None:
+        return 0
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _on_cpu_limit(signum, frame):
+    raise ExecutionTimeout("Temps CPU dépassé")
+
+
+def _set_cpu_limit(cpu_timeout):
+    """Limite le temps CPU de la prochaine exécution via RLIMIT_CPU (cumulatif pour le process).
+
+    Seule la limite souple est posée (une limite dure ne peut plus être relevée pour l'exécution suivante):
+    le code C qui ignore SIGXCPU est tué par le parent (_JobMonitor).
+    """
+    if resource is None or not hasattr(resource, "RLIMIT_CPU"):
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_timeout:
+        soft = int(_cpu_time() + cpu_timeout) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    else:
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+WATCH_INTERVAL = 0.2  # secondes entre deux relevés du worker pendant une exécution
+CPU_GRACE = 2.0  # secondes CPU laissées à SIGXCPU avant que le parent ne tue le worker
+_PAGE_SIZE = resource.getpagesize() if resource is not None else 4096
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _rss_mb(pid):
+    """Mémoire résidente d'un process (Linux), None si indisponible"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def _process_cpu_time(pid):
+    """Temps CPU (utilisateur + système) d'un process (Linux), None si indisponible"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _JobMonitor:
+    """Surveille le worker depuis le parent pendant une exécution: CPU consommé et croissance de la mémoire résidente.
+
+    Mesure le RSS réel (et non l'espace d'adressage, que numpy / matplotlib réservent largement).
+    Le CPU est aussi mesuré ici pour facturer les exécutions tuées, qui ne renvoient pas de résultat.
+    """
+
+    def __init__(self, pid, cpu_limit=None, memory_limit_mb=None):
+        self.pid = pid
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.base_cpu = _process_cpu_time(pid)
+        self.base_rss = _rss_mb(pid) if memory_limit_mb else None
+
+    @property
+    def active(self):
+        return self.base_rss is not None or (self.cpu_limit is not None and self.base_cpu is not None)
+
+    def cpu_used(self):
+        """Secondes CPU consommées depuis le début de l'exécution, None si indisponible"""
+        if self.base_cpu is None:
+            return None
+        current = _process_cpu_time(self.pid)
+        return None if current is None else current - self.base_cpu
+
+    def check(self):
+        """Raison d'arrêter l'exécution ("cpu" ou "memory"), None sinon"""
+        if self.cpu_limit is not None:
+            # Boucle en C qui ne rend jamais la main au handler SIGXCPU
+            cpu = self.cpu_used()
+            if cpu is not None and cpu > self.cpu_limit + CPU_GRACE:
+                return "cpu"
+        if self.base_rss is not None:
+            rss = _rss_mb(self.pid)
+            if rss is not None and rss - self.base_rss > self.memory_limit_mb:
+                return "memory"
+        return None
+
+
+def _worker_main(conn, max_memory_growth_mb, figure_options, persistent=False):
+    """Boucle d'un worker: reçoit du code par le pipe et renvoie le résultat.
+
+    `persistent`: le namespace est conservé d'une exécution à l'autre (kernel de conversation).
+    """
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    modules = prewarm_modules()
+    baseline_memory = _memory_usage_mb()
+    conn.send(("ready", None, False))
+    safe_globals = None
+
+    def send_chunk(chunk):
+        conn.send(("output", chunk, None))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+
+        if safe_globals is None or not persistent:
+            safe_globals = build_safe_globals()
+            safe_globals.update(modules)
+
+        cpu_start = _cpu_time() if resource is not None else None
+        _set_cpu_limit(request.get("cpu_timeout"))
+        try:
+            result = run_code(request["code"], safe_globals, on_chunk=send_chunk)
+        finally:
+            _set_cpu_limit(None)
+        if cpu_start is not None:
+            result['cpu_time'] = round(_cpu_time() - cpu_start, 3)
+
+        # Récupérer les figures puis ne pas les accumuler d'une exécution à l'autre
+        if 'plt' in modules:
+            try:
+                figures = capture_figures(modules['plt'], **figure_options)
+                if figures:
+                    result['figures'] = figures
+            finally:
+                try:
+                    modules['plt'].close('all')
+                except Exception:
+                    pass
+
+        # Après un MemoryError, l'état du worker n'est plus fiable: le faire remplacer
+        memory_exceeded = bool(result.get('out_of_memory')) or (
+            bool(baseline_memory) and _memory_usage_mb() - baseline_memory > max_memory_growth_mb
+        )
+        conn.send(("result", result, memory_exceeded))
+
+
+def _await_result(conn, timeout, on_output=None, monitor=None):
+    """Attend le résultat en relayant la sortie partielle à `on_output`.
+
+    Retourne (résultat, memory_exceeded), ou (None, raison) si l'exécution doit être tuée:
+    "timeout" (délai dépassé) ou la raison donnée par `monitor`.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        wait = remaining
+        if monitor is not None and monitor.active:
+            wait = WATCH_INTERVAL if remaining is None else min(remaining, WATCH_INTERVAL)
+        if not conn.poll(wait):
+            if remaining is not None and remaining <= wait:
+                return None, "timeout"
+            reason = monitor.check()
+            if reason:
+                return None, reason
+            continue
+        kind, payload, memory_exceeded = conn.recv()
+        if kind == "output":
+            if on_output is not None:
+                on_output(payload)
+            continue
+        return payload, memory_exceeded
+
+
+def _killed_result(reason, monitor, timeout):
+    """Résultat d'une exécution interrompue par le parent, à relever avant de tuer le worker.
+
+    Le CPU mesuré est facturé (à défaut, toute la limite accordée): tuer un job ne doit pas le rendre gratuit.
+    """
+    if reason == "memory":
+        result = {'success': False, 'output': '', 'memory_limit_exceeded': True,
+                  'error': f"Mémoire de l'exécution dépassée ({monitor.memory_limit_mb} Mo)"}
+    elif reason == "cpu":
+        result = {'success': False, 'output': '', 'error': "Temps CPU dépassé", 'cpu_exceeded': True}
+    else:
+        result = {'success': False, 'output': '', 'error': f"Temps d'exécution dépassé ({timeout}s)"}
+    cpu_time = monitor.cpu_used()
+    if cpu_time is None:
+        cpu_time = monitor.cpu_limit if monitor.cpu_limit is not None else (timeout or 0)
+    result['cpu_time'] = round(cpu_time, 3)
+    return result
+
+
+# Sous Streamlit, __main__ est le script de l'app: spawn le ré-exécuterait dans chaque worker.
+# Les workers n'en ont pas besoin (_worker_main vient de ce module): leur préparation omet __main__.
+# Choix par thread, sans toucher à sys.modules["__main__"] que les autres sessions utilisent.
+_spawning = threading.local()
+_get_preparation_data = getattr(multiprocessing.spawn.get_preparation_data, "original",
+                                multiprocessing.spawn.get_preparation_data)
+
+
+def _preparation_data(name):
+    data = _get_preparation_data(name)
+    if getattr(_spawning, "worker", False):
+        data.pop("init_main_from_path", None)
+        data.pop("init_main_from_name", None)
+    return data
+
+
+_preparation_data.original = _get_preparation_data
+multiprocessing.spawn.get_preparation_data = _preparation_data
+
+
+@contextlib.contextmanager
+def _without_main_module():
+    """Le process démarré dans ce bloc (par ce thread) n'importe pas le __main__ du parent"""
+    _spawning.worker = True
+    try:
+        yield
+    finally:
+        _spawning.worker = False
+
+
+class _Worker:
+    """Processus worker et son pipe de communication"""
+
+    def __init__(self, ctx, max_memory_growth_mb, figure_options, persistent=False):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, max_memory_growth_mb, figure_options, persistent), daemon=True
+        )
+        with _without_main_module():
+            self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if self.ready:
+            return True
+        if self.conn.poll(timeout):
+            kind, _, _ = self.conn.recv()
+            self.ready = kind == "ready"
+        return self.ready
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pool de workers pré-démarrés, recyclés après N exécutions ou sur croissance mémoire"""
+
+    def __init__(self, size=2, max_runs_per_worker=50, max_memory_growth_mb=500, startup_timeout=60,
+                 figure_options=None, scheduler=None):
+        self.size = size
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_memory_growth_mb = max_memory_growth_mb
+        self.startup_timeout = startup_timeout
+        # Options de capture des figures (format, dpi, max_size, max_figures, quality)
+        self.figure_options = dict(figure_options or {})
+        # Ordonnanceur partagé (slots globaux, quotas par session), optionnel
+        self.scheduler = scheduler
+
+        # spawn: ne jamais forker le serveur Streamlit (multi-threadé)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._closed = False
+
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.max_memory_growth_mb, self.figure_options)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def _release(self, worker, memory_exceeded=False):
+        worker.runs += 1
+        if memory_exceeded or worker.runs >= self.max_runs_per_worker:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+    def run(self, code, timeout=None, cpu_timeout=None, on_output=None, session_id=None, on_queue=None):
+        """Exécute le code dans un worker libre et retourne le résultat (`on_output(texte)`: sortie en direct).
+
+        Avec un ordonnanceur et `session_id`, l'exécution attend son tour (`on_queue(position)`)
+        et respecte les quotas de la session.
+        """
+        if self.scheduler is not None and session_id is not None:
+            return self.scheduler.run(
+                session_id,
+                lambda cpu_limit, memory_limit_mb: self._run(code, timeout, cpu_limit, on_output, memory_limit_mb),
+                cpu_timeout=cpu_timeout,
+                on_queue=on_queue,
+            )
+        return self._run(code, timeout, cpu_timeout, on_output)
+
+    def _run(self, code, timeout, cpu_timeout, on_output, memory_limit_mb=None):
+        worker = self._idle.get()
+        start_time = time.time()
+
+        result = self._run_on(worker, code, timeout, cpu_timeout, on_output, memory_limit_mb)
+        result['duration'] = round(time.time() - start_time, 2)
+        return result
+
+    def _run_on(self, worker, code, timeout, cpu_timeout, on_output, memory_limit_mb):
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                self._replace(worker)
+                return {'success': False, 'output': '', 'error': "Worker d'exécution indisponible"}
+
+            monitor = _JobMonitor(worker.process.pid, cpu_timeout, memory_limit_mb)
+            worker.conn.send({"code": code, "cpu_timeout": cpu_timeout})
+
+            result, memory_exceeded = _await_result(worker.conn, timeout, on_output, monitor)
+            if result is None:
+                # Exécution trop longue ou trop gourmande: tuer le worker et en démarrer un neuf
+                result = _killed_result(memory_exceeded, monitor, timeout)
+                self._replace(worker)
+                return result
+        except (EOFError, OSError, BrokenPipeError):
+            self._replace(worker)
+            return {'success': False, 'output': '', 'error': "Le worker d'exécution s'est arrêté de façon inattendue"}
+
+        self._release(worker, memory_exceeded)
+        return result
+
+    def run_many(self, codes, timeout=None, cpu_timeout=None, on_output=None, session_id=None, on_queue=None):
+        """Exécute plusieurs blocs en parallèle, produit (index, résultat) dans l'ordre de fin.
+
+        `on_output(index, texte)` et `on_queue(index, position)` sont appelés depuis les threads d'exécution.
+        """
+        if not codes:
+            return
+
+        def relay(callback, i):
+            return None if callback is None else (lambda value: callback(i, value))
+
+        with ThreadPoolExecutor(max_workers=len(codes)) as pool:
+            futures = {
+                pool.submit(
+                    self.run, code, timeout, cpu_timeout, relay(on_output, i), session_id, relay(on_queue, i)
+                ): i
+                for i, code in enumerate(codes)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def shutdown(self):
+        """Arrête tous les workers"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+class _Kernel:
+    """Worker dédié à une conversation"""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.lock = threading.Lock()  # une exécution à la fois: l'ordre des blocs compte
+        self.users = 0  # exécutions en cours ou en attente (sous le verrou du manager): jamais évincé
+        self.runs = 0
+        self.last_used = time.time()
+
+
+class KernelManager:
+    """Kernels persistants, un par conversation: les variables survivent d'un tour à l'autre.
+
+    Évincés après `idle_timeout` secondes d'inactivité, au-delà de `max_kernels` (le moins récent
+    qui n'exécute rien: dépassement temporaire si tous sont occupés) ou quand leur mémoire dépasse
+    `max_memory_mb`. Un kernel de réserve est gardé démarré.
+    """
+
+    def __init__(self, max_kernels=8, idle_timeout=900, max_memory_mb=1024, startup_timeout=60,
+                 figure_options=None, sweep_interval=30, scheduler=None):
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self.max_memory_mb = max_memory_mb
+        self.startup_timeout = startup_timeout
+        self.figure_options = dict(figure_options or {})
+        self.scheduler = scheduler
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._kernels = OrderedDict()  # id de conversation -> _Kernel (ordre d'utilisation)
+        self._spare = self._new_worker()
+        self._closed = threading.Event()
+        threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="kernel-sweeper", daemon=True).start()
+
+    def _new_worker(self):
+        return _Worker(self._ctx, self.max_memory_mb, self.figure_options, persistent=True)
+
+    def _acquire(self, kernel_id):
+        """Kernel de la conversation (pris sur la réserve s'il n'existe pas encore), à rendre via _release"""
+        evicted = []
+        with self._lock:
+            kernel = self._kernels.get(kernel_id)
+            if kernel is None:
+                kernel = self._kernels[kernel_id] = _Kernel(self._spare or self._new_worker())
+                self._spare = self._new_worker()
+                # Les moins récents d'abord, sans toucher à ceux qui exécutent ou attendent du code
+                for old_id, old in list(self._kernels.items()):
+                    if len(self._kernels) <= self.max_kernels:
+                        break
+                    if old.users == 0 and old is not kernel:
+                        del self._kernels[old_id]
+                        evicted.append(old)
+            else:
+                self._kernels.move_to_end(kernel_id)
+            kernel.users += 1
+        for old in evicted:
+            old.worker.stop()
+        return kernel
+
+    def _release(self, kernel):
+        with self._lock:
+            kernel.users -= 1
+
+    def _discard(self, kernel_id, kernel):
+        with self._lock:
+            if self._kernels.get(kernel_id) is kernel:
+                del self._kernels[kernel_id]
+        kernel.worker.stop()
+
+    def run(self, kernel_id, code, timeout=None, cpu_timeout=None, on_output=None, session_id=None, on_queue=None):
+        """Exécute le code dans le kernel de la conversation et retourne le résultat"""
+        kernel = self._acquire(kernel_id)
+
+        def execute(cpu_limit, memory_limit_mb=None):
+            start_time = time.time()
+            result = self._run_on(kernel_id, kernel, code, timeout, cpu_limit, on_output, memory_limit_mb)
+            result['duration'] = round(time.time() - start_time, 2)
+            kernel.last_used = time.time()
+            return result
+
+        # Verrou du kernel avant le slot: ne pas occuper un slot global en attendant son propre kernel
+        try:
+            with kernel.lock:
+                if self.scheduler is not None and session_id is not None:
+                    return self.scheduler.run(session_id, execute, cpu_timeout=cpu_timeout, on_queue=on_queue)
+                return execute(cpu_timeout)
+        finally:
+            self._release(kernel)
+
+    def _run_on(self, kernel_id, kernel, code, timeout, cpu_timeout, on_output, memory_limit_mb):
+        worker = kernel.worker
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                self._discard(kernel_id, kernel)
+                return {'success': False, 'output': '', 'error': "Kernel d'exécution indisponible"}
+
+            monitor = _JobMonitor(worker.process.pid, cpu_timeout, memory_limit_mb)
+            worker.conn.send({"code": code, "cpu_timeout": cpu_timeout})
+
+            result, memory_exceeded = _await_result(worker.conn, timeout, on_output, monitor)
+            if result is None:
+                result = _killed_result(memory_exceeded, monitor, timeout)
+                self._discard(kernel_id, kernel)
+                result['kernel_restarted'] = "memory" if result.get('memory_limit_exceeded') else "timeout"
+                return result
+        except (EOFError, OSError, BrokenPipeError):
+            self._discard(kernel_id, kernel)
+            return {'success': False, 'output': '',
+                    'error': "Le kernel s'est arrêté de façon inattendue", 'kernel_restarted': "crash"}
+
+        kernel.runs += 1
+        if memory_exceeded:
+            # Résultat valide, mais le kernel ne doit pas grossir davantage
+            self._discard(kernel_id, kernel)
+            result['kernel_restarted'] = "memory"
+        return result
+
+    def run_many(self, kernel_id, codes, timeout=None, cpu_timeout=None, on_output=None, session_id=None,
+                 on_queue=None):
+        """Exécute les blocs l'un après l'autre dans le kernel, produit (index, résultat)"""
+        for i, code in enumerate(codes):
+            relay_output = None if on_output is None else (lambda chunk, i=i: on_output(i, chunk))
+            relay_queue = None if on_queue is None else (lambda position, i=i: on_queue(i, position))
+            yield i, self.run(kernel_id, code, timeout, cpu_timeout, relay_output, session_id, relay_queue)
+
+    def info(self, kernel_id):
+        """Exécutions et inactivité du kernel, None s'il n'est pas démarré"""
+        with self._lock:
+            kernel = self._kernels.get(kernel_id)
+        if kernel is None:
+            return None
+        return {"runs": kernel.runs, "idle_seconds": round(time.time() - kernel.last_used)}
+
+    def restart(self, kernel_id):
+        """Arrête le kernel de la conversation (le prochain code repart d'un namespace vide)"""
+        with self._lock:
+            kernel = self._kernels.pop(kernel_id, None)
+        if kernel is not None:
+            kernel.worker.stop()
+        return kernel is not None
+
+    def evict_idle(self):
+        """Arrête les kernels inactifs depuis plus de `idle_timeout` secondes"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for kernel_id, kernel in list(self._kernels.items()):
+                if now - kernel.last_used > self.idle_timeout and kernel.users == 0:
+                    del self._kernels[kernel_id]
+                    evicted.append(kernel)
+        for kernel in evicted:
+            kernel.worker.stop()
+        return len(evicted)
+
+    def _sweep_loop(self, interval):
+        while not self._closed.wait(interval):
+            self.evict_idle()
+
+    def shutdown(self):
+        """Arrête tous les kernels et la réserve"""
+        self._closed.set()
+        with self._lock:
+            kernels = list(self._kernels.values())
+            self._kernels.clear()
+            spare, self._spare = self._spare, None
+        for kernel in kernels:
+            kernel.worker.stop()
+        if spare is not None:
+            spare.stop()
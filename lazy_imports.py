@@ -0,0 +1,73 @@
+"""
+Imports paresseux et profil du temps d'import
+Les modules lourds ne sont chargés qu'à la première utilisation (ou pré-chargés en arrière-plan)
+"""
+
+import importlib
+import sys
+import threading
+import time
+import types
+
+_import_timings = {}
+_timings_lock = threading.Lock()
+
+
+def timed_import(name):
+    """Importe un module en mesurant la durée du premier import (ms)"""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if not already_loaded:
+        with _timings_lock:
+            _import_timings.setdefault(name, elapsed_ms)
+    return module
+
+
+class LazyModule(types.ModuleType):
+    """Proxy de module: l'import réel a lieu au premier accès à un attribut"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = timed_import(self.__dict__["_lazy_name"])
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """Retourne un proxy paresseux pour le module `name`"""
+    return LazyModule(name)
+
+
+def prewarm(names):
+    """Importe les modules en arrière-plan (thread daemon) et retourne le thread"""
+    def _run():
+        for name in names:
+            try:
+                timed_import(name)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=_run, name="prewarm-imports", daemon=True)
+    thread.start()
+    return thread
+
+
+def import_profile():
+    """Durées d'import mesurées, triées de la plus lente à la plus rapide: [(module, ms)]"""
+    with _timings_lock:
+        return sorted(_import_timings.items(), key=lambda item: item[1], reverse=True)
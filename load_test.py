@@ -0,0 +1,192 @@
+"""
+Test de charge multi-sessions de l'app Streamlit, modèle remplacé par le serveur local (stub_server)
+N sessions simulées (AppTest) en parallèle dans un même process, comme sur le serveur partagé:
+tours de chat, d'exécution Python et de génération de projets mélangés
+
+Usage: python load_test.py --sessions 8 --turns 5 [--mix standard=0.5,code_execution=0.3,code_generation=0.2]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from stub_server import StubServer
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+
+WORK_MODES = {
+    "standard": "💬 Chat Standard",
+    "code_execution": "⚡ Exécution Python",
+    "code_generation": "🔧 Génération de Code",
+}
+
+
+def parse_mix(spec):
+    """Proportions des modes: "standard=0.5,code_execution=0.3" -> {mode: poids}"""
+    mix = {}
+    for part in spec.split(","):
+        mode, _, weight = part.partition("=")
+        mode = mode.strip()
+        if mode not in WORK_MODES:
+            raise ValueError(f"Mode inconnu: {mode!r}")
+        mix[mode] = float(weight or 1)
+    return mix
+
+
+def percentiles(durations):
+    """Percentiles d'une série de durées en ms"""
+    if not durations:
+        return {"count": 0}
+    ordered = sorted(durations)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1], 1),
+        "mean_ms": round(statistics.fmean(ordered), 1),
+    }
+
+
+class SimulatedSession:
+    """Une session navigateur: enchaîne des tours et chronomètre chaque rerun"""
+
+    def __init__(self, session_id, turns, mix, rng, timeout):
+        self.session_id = session_id
+        self.turns = turns
+        self.mix = mix
+        self.rng = rng
+        self.timeout = timeout
+        self.samples = []  # (type, mode, durée ms, erreur ou None)
+
+    def _timed_run(self, at, kind, mode):
+        start = time.perf_counter()
+        error = None
+        try:
+            at.run(timeout=self.timeout)
+            if at.exception:
+                error = at.exception[0].value
+            elif at.error:
+                error = at.error[-1].value
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.samples.append((kind, mode, (time.perf_counter() - start) * 1000, error))
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(str(APP_PATH), default_timeout=self.timeout)
+        self._timed_run(at, "first_load", None)
+        current_mode = "standard"
+        modes, weights = zip(*self.mix.items())
+
+        for turn in range(self.turns):
+            mode = self.rng.choices(modes, weights)[0]
+            if mode != current_mode:
+                at.sidebar.selectbox[0].set_value(WORK_MODES[mode])
+                self._timed_run(at, "interaction", mode)
+                current_mode = mode
+
+            # Prompt unique par session et par tour: pas de réponse en cache
+            at.chat_input[0].set_value(f"Session {self.session_id} tour {turn}: demande {mode}")
+            self._timed_run(at, "turn", mode)
+
+            # Rerun sans saisie (clic dans la sidebar): coût de l'historique qui grandit
+            self._timed_run(at, "idle_rerun", mode)
+
+
+def run_load_test(sessions, turns, mix, ramp_up, seed, timeout):
+    """Lance les sessions en parallèle et agrège les mesures"""
+    simulated = [
+        SimulatedSession(i, turns, mix, random.Random(seed + i), timeout) for i in range(sessions)
+    ]
+    threads = []
+    start = time.perf_counter()
+    for i, session in enumerate(simulated):
+        thread = threading.Thread(target=session.run, name=f"session-{i}", daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp_up and i < sessions - 1:
+            time.sleep(ramp_up / sessions)
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    samples = [sample for session in simulated for sample in session.samples]
+    turn_samples = [s for s in samples if s[0] == "turn"]
+    errors = [s for s in samples if s[3]]
+
+    report = {
+        "wall_time_s": round(wall_time, 2),
+        "turns": len(turn_samples),
+        "throughput_turns_per_s": round(len(turn_samples) / wall_time, 3) if wall_time else None,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "error_samples": sorted({s[3] for s in errors})[:10],
+        "latency": {
+            kind: percentiles([s[2] for s in samples if s[0] == kind])
+            for kind in ("first_load", "interaction", "turn", "idle_rerun")
+        },
+        "turn_latency_by_mode": {
+            mode: percentiles([s[2] for s in turn_samples if s[1] == mode]) for mode in mix
+        },
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge multi-sessions (sortie JSON)")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions simultanées")
+    parser.add_argument("--turns", type=int, default=5, help="tours de chat par session")
+    parser.add_argument("--mix", default="standard=0.5,code_execution=0.3,code_generation=0.2",
+                        help="proportions des modes")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="délai total de démarrage des sessions (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="timeout d'un rerun (s)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="TTFT simulé par le stub (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=300.0, help="débit simulé par le stub")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part de réponses 429 du stub")
+    parser.add_argument("-o", "--output", type=Path, help="fichier JSON du rapport (défaut: stdout)")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory(prefix="load_") as tmp, \
+            StubServer(ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+                       error_rate=args.error_rate) as stub:
+        os.environ.update(HF_TOKEN="stub", LLM_BASE_URL=stub.base_url, LLM_ENDPOINTS="stub")
+        cwd = os.getcwd()
+        os.chdir(tmp)  # l'app écrit ses fichiers dans le dossier courant
+        try:
+            report = run_load_test(args.sessions, args.turns, mix, args.ramp_up, args.seed, args.timeout)
+        finally:
+            os.chdir(cwd)
+        report["model_requests"] = stub.requests
+
+    report["config"] = {
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "mix": mix,
+        "stub": {"ttft": args.ttft, "tokens_per_second": args.tokens_per_second, "error_rate": args.error_rate},
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Routage des requêtes entre plusieurs endpoints modèle/provider
+Statistiques glissantes par endpoint et par mode (TTFT, tokens/s, erreurs) et bascule automatique
+"""
+
+import collections
+import random
+import threading
+import time
+
+import openai
+
+from request_pipeline import DeadlineExceeded, RETRYABLE_ERRORS
+
+# Erreurs qui justifient de passer à l'endpoint suivant
+FAILOVER_ERRORS = RETRYABLE_ERRORS + (openai.NotFoundError, DeadlineExceeded)
+
+# Longueur de réponse typique par mode, pour estimer la latence totale
+EXPECTED_OUTPUT_TOKENS = {
+    "standard": 800,
+    "code_execution": 1200,
+    "code_generation": 2500,
+}
+
+COOLDOWN_SECONDS = 30  # endpoint écarté après plusieurs erreurs consécutives
+COOLDOWN_AFTER_ERRORS = 3
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FailoverRestart:
+    """Marqueur inséré dans un flux quand la génération reprend de zéro sur un autre endpoint"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+
+class _EndpointStats:
+    def __init__(self, window):
+        self.ttft = collections.deque(maxlen=window)
+        self.tokens_per_second = collections.deque(maxlen=window)
+        self.outcomes = collections.deque(maxlen=window)  # True = succès
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def summary(self):
+        errors = sum(1 for ok in self.outcomes if not ok)
+        return {
+            "requests": len(self.outcomes),
+            "ttft_p50": _percentile(self.ttft, 0.5),
+            "ttft_p95": _percentile(self.ttft, 0.95),
+            "tokens_per_second": _percentile(self.tokens_per_second, 0.5),
+            "error_rate": errors / len(self.outcomes) if self.outcomes else 0.0,
+        }
+
+
+class ModelRouter:
+    """Choisit le meilleur endpoint pour chaque requête et bascule en cas d'erreur"""
+
+    def __init__(self, endpoints, clients, window=100, explore_rate=0.05):
+        """`endpoints`: [{"name", "model", "base_url"}]; `clients`: base_url -> client compatible OpenAI"""
+        self.endpoints = endpoints
+        self.clients = clients
+        self.window = window
+        self.explore_rate = explore_rate
+        self._lock = threading.Lock()
+        self._stats = {}  # (nom, mode) -> _EndpointStats
+
+    def _get_stats(self, name, mode):
+        key = (name, mode)
+        if key not in self._stats:
+            self._stats[key] = _EndpointStats(self.window)
+        return self._stats[key]
+
+    def _expected_latency(self, endpoint, mode):
+        summary = self._get_stats(endpoint["name"], mode).summary()
+        if summary["requests"] == 0 or summary["ttft_p50"] is None:
+            return None
+        tokens_per_second = summary["tokens_per_second"] or 1.0
+        latency = summary["ttft_p50"] + EXPECTED_OUTPUT_TOKENS.get(mode, 1000) / tokens_per_second
+        # Une erreur coûte en moyenne un aller-retour supplémentaire
+        return latency / max(0.05, 1.0 - summary["error_rate"])
+
+    def rank(self, mode):
+        """Endpoints du meilleur au moins bon pour ce mode"""
+        now = time.monotonic()
+        with self._lock:
+            scored = []
+            for position, endpoint in enumerate(self.endpoints):
+                stats = self._get_stats(endpoint["name"], mode)
+                cooling = stats.cooldown_until > now
+                latency = self._expected_latency(endpoint, mode)
+                # Sans mesure: ordre de la configuration, après les endpoints mesurés
+                scored.append((cooling, latency is None, latency or 0.0, position, endpoint))
+        scored.sort(key=lambda item: item[:4])
+        ranked = [item[-1] for item in scored]
+
+        # Exploration occasionnelle pour garder des mesures à jour sur les autres endpoints
+        if len(ranked) > 1 and random.random() < self.explore_rate:
+            explored = ranked.pop(random.randrange(1, len(ranked)))
+            ranked.insert(0, explored)
+        return ranked
+
+    def record(self, name, mode, success, ttft=None, tokens_per_second=None):
+        """Ajoute une mesure pour un endpoint"""
+        with self._lock:
+            stats = self._get_stats(name, mode)
+            stats.outcomes.append(success)
+            if success:
+                stats.consecutive_errors = 0
+                if ttft is not None:
+                    stats.ttft.append(ttft)
+                if tokens_per_second:
+                    stats.tokens_per_second.append(tokens_per_second)
+            else:
+                stats.consecutive_errors += 1
+                if stats.consecutive_errors >= COOLDOWN_AFTER_ERRORS:
+                    stats.cooldown_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def summary(self, mode=None):
+        """Statistiques par endpoint (tous modes confondus si `mode` est None)"""
+        with self._lock:
+            result = {}
+            for endpoint in self.endpoints:
+                keys = [k for k in self._stats if k[0] == endpoint["name"] and (mode is None or k[1] == mode)]
+                merged = _EndpointStats(self.window * max(1, len(keys)))
+                for key in keys:
+                    stats = self._stats[key]
+                    merged.ttft.extend(stats.ttft)
+                    merged.tokens_per_second.extend(stats.tokens_per_second)
+                    merged.outcomes.extend(stats.outcomes)
+                result[endpoint["name"]] = merged.summary()
+            return result
+
+    def _client(self, endpoint):
+        return self.clients[endpoint.get("base_url")]
+
+    def complete(self, mode, **kwargs):
+        """Requête non streamée: retourne (completion, nom de l'endpoint)"""
+        last_error = None
+        for endpoint in self.rank(mode):
+            start = time.monotonic()
+            try:
+                completion = self._client(endpoint).chat.completions.create(model=endpoint["model"], **kwargs)
+            except FAILOVER_ERRORS as e:
+                self.record(endpoint["name"], mode, False)
+                last_error = e
+                continue
+
+            elapsed = time.monotonic() - start
+            usage = getattr(completion, "usage", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+            self.record(
+                endpoint["name"], mode, True,
+                ttft=elapsed,  # sans streaming, le premier token arrive avec la réponse
+                tokens_per_second=completion_tokens / elapsed if completion_tokens and elapsed > 0 else None,
+            )
+            return completion, endpoint["name"]
+        raise last_error or RuntimeError(f"Aucun endpoint disponible pour le mode {mode}")
+
+    def stream(self, mode, **kwargs):
+        """Requête streamée avec bascule en cours de génération"""
+        return RoutedStream(self, mode, kwargs)
+
+
+class RoutedStream:
+    """Itérateur de chunks; `endpoint` indique l'endpoint en cours.
+
+    Si l'endpoint échoue en cours de flux, un `FailoverRestart` est émis puis la génération
+    reprend depuis le début sur l'endpoint suivant.
+    """
+
+    def __init__(self, router, mode, kwargs):
+        self.router = router
+        self.mode = mode
+        self.kwargs = kwargs
+        self._candidates = router.rank(mode)
+        self.endpoint = None
+        self.queue_wait = 0.0  # attente d'un slot de concurrence, tous endpoints essayés
+        self._stream = None
+        self._open_next()  # erreurs d'ouverture non récupérables levées ici
+
+    def _open_next(self, last_error=None):
+        """Ouvre le flux sur le prochain endpoint; sinon relève `last_error` (erreur qui a causé la bascule)"""
+        while self._candidates:
+            endpoint = self._candidates.pop(0)
+            self._start = time.monotonic()
+            try:
+                self._stream = self.router._client(endpoint).chat.completions.create(
+                    stream=True, model=endpoint["model"], **self.kwargs
+                )
+                self.queue_wait += getattr(self._stream, "queue_wait", None) or 0.0
+            except FAILOVER_ERRORS as e:
+                self.router.record(endpoint["name"], self.mode, False)
+                last_error = e
+                continue
+            self.endpoint = endpoint["name"]
+            return
+        raise last_error or RuntimeError(f"Aucun endpoint disponible pour le mode {self.mode}")
+
+    def __iter__(self):
+        while True:
+            first_token_time = None
+            chunk_count = 0
+            completion_tokens = None
+            try:
+                for chunk in self._stream:
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None and getattr(usage, "completion_tokens", None):
+                        completion_tokens = usage.completion_tokens
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token_time is None:
+                            first_token_time = time.monotonic()
+                        chunk_count += 1
+                    yield chunk
+            except FAILOVER_ERRORS as e:
+                self.router.record(self.endpoint, self.mode, False)
+                self._open_next(e)  # relève l'erreur s'il n'y a plus d'endpoint
+                yield FailoverRestart(self.endpoint)
+                continue
+
+            end = time.monotonic()
+            generated = completion_tokens or chunk_count
+            generation_time = end - (first_token_time or self._start)
+            self.router.record(
+                self.endpoint, self.mode, True,
+                ttft=(first_token_time - self._start) if first_token_time else None,
+                tokens_per_second=generated / generation_time if generation_time > 0 else None,
+            )
+            return
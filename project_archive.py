@@ -0,0 +1,50 @@
+"""
+Archives ZIP des projets générés
+Construites en mémoire et identifiées par le hash du contenu du projet
+"""
+
+import hashlib
+import io
+import zipfile
+from pathlib import Path
+
+# Formats déjà compressés: stockés tels quels (recompresser ne gagne rien)
+STORED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z',
+    '.mp3', '.mp4', '.ogg', '.webm', '.woff', '.woff2', '.pdf',
+}
+
+
+def _project_files(project_path):
+    return sorted(p for p in Path(project_path).rglob('*') if p.is_file())
+
+
+def project_content_hash(project_path):
+    """Hash SHA-256 des chemins relatifs et du contenu de tous les fichiers du projet"""
+    project_path = Path(project_path)
+    digest = hashlib.sha256()
+    for file_path in _project_files(project_path):
+        digest.update(file_path.relative_to(project_path).as_posix().encode('utf-8'))
+        digest.update(b'\0')
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def build_zip_bytes(project_path, compresslevel=6):
+    """Construit l'archive du projet directement en mémoire"""
+    project_path = Path(project_path)
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zipf:
+        for file_path in _project_files(project_path):
+            arcname = file_path.relative_to(project_path)
+            if file_path.suffix.lower() in STORED_EXTENSIONS:
+                zipf.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zipf.write(file_path, arcname)
+
+    return buffer.getvalue()
@@ -0,0 +1,126 @@
+"""
+Catalogue des projets générés
+Index SQLite (nom, date, nb de fichiers, taille, description) pour lister sans parcourir le disque
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+def _project_stats(project_path):
+    """Nombre de fichiers et taille totale d'un projet"""
+    file_count = 0
+    total_size = 0
+    for file_path in project_path.rglob('*'):
+        if file_path.is_file():
+            file_count += 1
+            total_size += file_path.stat().st_size
+    return file_count, total_size
+
+
+class ProjectCatalog:
+    """Index des projets, resynchronisé seulement quand le mtime du dossier change"""
+
+    def __init__(self, db_path, projects_dir):
+        self.projects_dir = Path(projects_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS projects (
+                name TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                file_count INTEGER NOT NULL DEFAULT 0,
+                total_size INTEGER NOT NULL DEFAULT 0,
+                description TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _dir_mtime(self):
+        try:
+            return str(self.projects_dir.stat().st_mtime_ns)
+        except OSError:
+            return None
+
+    def _set_synced_mtime(self, mtime):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime', ?)", (mtime,))
+
+    def add(self, project_path, description="", file_count=None, total_size=None):
+        """Enregistre un projet qui vient d'être écrit"""
+        project_path = Path(project_path)
+        if file_count is None or total_size is None:
+            file_count, total_size = _project_stats(project_path)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO projects (name, created_at, file_count, total_size, description)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (project_path.name, datetime.datetime.now().isoformat(), file_count, total_size, description or ""),
+            )
+        # Le mtime du dossier n'est pas marqué comme synchronisé: un projet ajouté par
+        # ailleurs entre-temps sera repris au prochain refresh_if_stale
+
+    def refresh_if_stale(self):
+        """Resynchronise avec le disque si le dossier des projets a changé (un seul stat sinon)"""
+        mtime = self._dir_mtime()
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+            if mtime is None or (row and row[0] == mtime):
+                return False
+
+            known = {name for (name,) in self._conn.execute("SELECT name FROM projects")}
+            with os.scandir(self.projects_dir) as entries:
+                on_disk = {e.name: Path(e.path) for e in entries if e.is_dir()}
+
+            with self._conn:
+                for name in known - on_disk.keys():
+                    self._conn.execute("DELETE FROM projects WHERE name = ?", (name,))
+                for name in on_disk.keys() - known:
+                    project_path = on_disk[name]
+                    file_count, total_size = _project_stats(project_path)
+                    created_at = datetime.datetime.fromtimestamp(project_path.stat().st_mtime).isoformat()
+                    self._conn.execute(
+                        """INSERT INTO projects (name, created_at, file_count, total_size, description)
+                           VALUES (?, ?, ?, ?, '')""",
+                        (name, created_at, file_count, total_size),
+                    )
+                self._set_synced_mtime(mtime)
+            return True
+
+    def _where(self, search):
+        if not search:
+            return "", []
+        pattern = f"%{search.strip()}%"
+        return " WHERE name LIKE ? OR description LIKE ?", [pattern, pattern]
+
+    def list(self, limit=3, offset=0, search=None):
+        """Projets les plus récents d'abord, avec pagination et recherche"""
+        where, params = self._where(search)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT name, created_at, file_count, total_size, description FROM projects{where}
+                    ORDER BY created_at DESC LIMIT ? OFFSET ?""",
+                params + [limit, offset],
+            ).fetchall()
+        return [
+            {"name": name, "created_at": created_at, "file_count": file_count,
+             "total_size": total_size, "description": description}
+            for name, created_at, file_count, total_size, description in rows
+        ]
+
+    def count(self, search=None):
+        """Nombre de projets (filtrés par la recherche)"""
+        where, params = self._where(search)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM projects{where}", params).fetchone()[0]
@@ -0,0 +1,153 @@
+"""
+Parser incrémental du format projet (bloc ```json)
+Émet chaque entrée de `files` dès que son objet JSON est fermé, pendant le streaming
+"""
+
+import json
+
+FENCE = "```json"
+
+
+def _decode(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class ProjectStreamParser:
+    """Consomme le texte par morceaux et détecte les fichiers du projet au fil de l'eau.
+
+    Chaque caractère n'est lu qu'une fois: seuls le bloc JSON, l'objet fichier en cours
+    et les chaînes de premier niveau sont conservés.
+    """
+
+    def __init__(self):
+        self._pending = ""  # texte hors bloc, en attente de la clôture ```json
+        self.project = None  # dict complet une fois le bloc terminé
+        self._reset_block()
+
+    def _reset_block(self):
+        self._in_block = False
+        self._block_parts = []
+        self._stack = []            # conteneurs ouverts: type et s'il s'agit du tableau `files`
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._last_key = None
+        self._string_parts = None   # chaîne de premier niveau en cours (clé ou valeur)
+        self._file_parts = None     # objet fichier en cours
+        self.meta = {}              # valeurs texte de premier niveau (name, description...)
+        self.files = []
+
+    @property
+    def done(self):
+        return self.project is not None
+
+    def feed(self, chunk):
+        """Ajoute un morceau de texte et retourne les nouveaux fichiers complets"""
+        new_files = []
+        while chunk and not self.done:
+            if not self._in_block:
+                chunk = self._find_block(chunk)
+                if not self._in_block:
+                    break
+            # Le reste éventuel suit un bloc ```json qui n'était pas un projet
+            chunk = self._scan(chunk, new_files)
+        return new_files
+
+    def _find_block(self, chunk):
+        self._pending += chunk
+        index = self._pending.find(FENCE)
+        if index == -1:
+            # Garder de quoi détecter une clôture coupée entre deux morceaux
+            self._pending = self._pending[-(len(FENCE) - 1):]
+            return ""
+
+        newline = self._pending.find("\n", index + len(FENCE))
+        if newline == -1:
+            self._pending = self._pending[index:]
+            return ""
+
+        rest = self._pending[newline + 1:]
+        self._pending = ""
+        self._in_block = True
+        return rest
+
+    def _in_files_array(self):
+        return len(self._stack) == 2 and self._stack[-1]["is_files"]
+
+    def _scan(self, chunk, new_files):
+        string_from = 0 if self._string_parts is not None else None
+        file_from = 0 if self._file_parts is not None else None
+
+        for i, char in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_parts is not None:
+                        self._string_parts.append(chunk[string_from:i + 1])
+                        self._on_string("".join(self._string_parts))
+                        self._string_parts = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if len(self._stack) == 1 and self._stack[0]["type"] == "{":
+                    self._string_parts = []
+                    string_from = i
+            elif char in "{[":
+                if char == "{" and self._in_files_array():
+                    self._file_parts = []
+                    file_from = i
+                is_files = char == "[" and len(self._stack) == 1 and self._last_key == "files"
+                self._stack.append({"type": char, "is_files": is_files})
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == "}" and self._file_parts is not None and self._in_files_array():
+                    self._file_parts.append(chunk[file_from:i + 1])
+                    file_info = _decode("".join(self._file_parts))
+                    self._file_parts = None
+                    if isinstance(file_info, dict):
+                        self.files.append(file_info)
+                        new_files.append(file_info)
+                if not self._stack:
+                    self._block_parts.append(chunk[:i + 1])
+                    self._on_block_end()
+                    return chunk[i + 1:]
+            elif char == ",":
+                if self._stack and self._stack[-1]["type"] == "{":
+                    self._expect_key = True
+            elif char == ":":
+                self._expect_key = False
+
+        # Fin du morceau: conserver les captures partielles
+        self._block_parts.append(chunk)
+        if self._string_parts is not None:
+            self._string_parts.append(chunk[string_from:])
+        if self._file_parts is not None:
+            self._file_parts.append(chunk[file_from:])
+        return ""
+
+    def _on_string(self, raw):
+        if self._expect_key:
+            self._last_key = _decode(raw)
+            self._expect_key = False
+        elif self._last_key is not None:
+            self.meta[self._last_key] = _decode(raw)
+
+    def _on_block_end(self):
+        data = _decode("".join(self._block_parts))
+        if isinstance(data, dict) and "files" in data:
+            self.project = data
+            return
+
+        # Bloc ```json qui n'est pas un projet: chercher le suivant
+        self._reset_block()
@@ -0,0 +1,218 @@
+"""
+Couche de requêtes vers le modèle
+Client async partagé (pool HTTP keep-alive borné), deadlines, retries avec backoff et limite de concurrence
+"""
+
+import asyncio
+import email.utils
+import queue
+import random
+import threading
+import time
+
+import httpx
+import openai
+
+# Erreurs transitoires: on réessaie (429, 5xx, réseau, timeout)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,  # inclut APITimeoutError
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Deadline de la requête dépassée (retries compris)"""
+
+
+def _retry_after_seconds(error):
+    """Délai demandé par le serveur (Retry-After / retry-after-ms), None si absent"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+        if parsed is None:
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+
+
+class _Stream:
+    """Itérateur synchrone de chunks; `queue_wait`: attente d'un slot de concurrence (s)"""
+
+    def __init__(self, iterator, queue_wait):
+        self._iterator = iterator
+        self.queue_wait = queue_wait
+
+    def __iter__(self):
+        return self._iterator
+
+
+class _Completions:
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def create(self, stream=False, **kwargs):
+        if stream:
+            return self._pipeline.stream(**kwargs)
+        return self._pipeline.complete(**kwargs)
+
+
+class _Chat:
+    def __init__(self, pipeline):
+        self.completions = _Completions(pipeline)
+
+
+class RequestPipeline:
+    """Pipeline partagé par toutes les sessions du process.
+
+    Les requêtes tournent sur une boucle asyncio dédiée (thread de fond); le script Streamlit
+    les appelle de façon synchrone via `pipeline.chat.completions.create(...)`.
+    """
+
+    def __init__(self, base_url, api_key, max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=60, max_concurrency=8, max_retries=4, deadline=180,
+                 backoff_base=0.5, backoff_max=20):
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="request-pipeline", daemon=True)
+        self._thread.start()
+
+        async def _setup():
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(deadline, connect=10),
+            )
+            client = openai.AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=http_client,
+                max_retries=0,  # les retries sont gérés ici
+            )
+            return client, asyncio.Semaphore(max_concurrency)
+
+        self._client, self._semaphore = self._run(_setup())
+        self.chat = _Chat(self)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Backoff exponentiel avec jitter complet
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _with_retries(self, deadline, call):
+        """Exécute `call()` avec retries, en respectant la deadline absolue"""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Deadline de la requête dépassée")
+            try:
+                return await asyncio.wait_for(call(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Deadline de la requête dépassée")
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _complete(self, deadline, kwargs):
+        async with self._semaphore:
+            return await self._with_retries(
+                deadline, lambda: self._client.chat.completions.create(**kwargs)
+            )
+
+    def complete(self, deadline=None, **kwargs):
+        """Requête non streamée (bloquante pour l'appelant)"""
+        absolute_deadline = time.monotonic() + (deadline or self.deadline)
+        return self._run(self._complete(absolute_deadline, kwargs))
+
+    async def _stream_into(self, events, deadline, kwargs):
+        try:
+            queued_at = time.monotonic()
+            async with self._semaphore:
+                queue_wait = time.monotonic() - queued_at
+                # Retries seulement avant le premier chunk: un flux entamé ne peut pas être rejoué
+                stream = await self._with_retries(
+                    deadline, lambda: self._client.chat.completions.create(stream=True, **kwargs)
+                )
+                events.put(("started", queue_wait))
+                iterator = stream.__aiter__()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("Deadline de la requête dépassée")
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("Deadline de la requête dépassée")
+                    events.put(("chunk", chunk))
+            events.put(("end", None))
+        except asyncio.CancelledError:
+            events.put(("end", None))
+            raise
+        except Exception as e:
+            events.put(("error", e))
+
+    def stream(self, deadline=None, **kwargs):
+        """Requête streamée: attend le début du flux puis retourne un itérable synchrone de chunks"""
+        absolute_deadline = time.monotonic() + (deadline or self.deadline)
+        events = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream_into(events, absolute_deadline, kwargs), self._loop
+        )
+
+        # Les erreurs d'ouverture (ex: BadRequest) remontent ici, comme avec le client synchrone
+        kind, payload = events.get()
+        if kind == "error":
+            raise payload
+        if kind == "end":
+            return _Stream(iter(()), None)
+        return _Stream(self._iterate(events, future), payload)
+
+    def _iterate(self, events, future):
+        try:
+            while True:
+                kind, payload = events.get()
+                if kind == "chunk":
+                    yield payload
+                elif kind == "error":
+                    raise payload
+                else:
+                    return
+        finally:
+            # Consommateur arrêté avant la fin: libérer la connexion et le slot
+            if not future.done():
+                future.cancel()
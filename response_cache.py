@@ -0,0 +1,155 @@
+"""
+Cache des réponses du modèle
+Deux niveaux: LRU en mémoire + stockage SQLite persistant entre les sessions
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def make_cache_key(model, messages, temperature, max_tokens):
+    """Calcule la clé de cache d'une requête (hash du modèle, des messages et des paramètres)"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache à deux niveaux partagé par toutes les sessions du process"""
+
+    def __init__(self, db_path, max_memory_entries=256, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.db_path = Path(db_path)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (response, created_at)
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Retourne la réponse en cache ou None"""
+        now = time.time()
+        with self._lock:
+            # 1. Mémoire
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            # 2. Disque
+            try:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    response, created_at = row
+                    if not self._expired(created_at, now):
+                        self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        self._remember(key, response, created_at)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return response
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+            except sqlite3.Error:
+                pass
+
+            self.misses += 1
+            return None
+
+    def set(self, key, response):
+        """Enregistre une réponse dans les deux niveaux"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                self._evict(now)
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, now):
+        # Entrées expirées puis les moins récemment utilisées au-delà de la limite
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def clear(self):
+        """Vide le cache (mémoire et disque)"""
+        with self._lock:
+            self._memory.clear()
+            try:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        """Compteurs du cache"""
+        with self._lock:
+            try:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                disk_entries = 0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
@@ -0,0 +1,173 @@
+"""
+Ordonnanceur des exécutions de code
+Nombre global d'exécutions simultanées limité, file équitable entre sessions
+(la session qui a consommé le moins de CPU récemment passe en premier) et quotas CPU / mémoire par session
+"""
+
+import contextlib
+import threading
+import time
+from collections import deque
+
+
+class QuotaExceeded(Exception):
+    """Quota CPU de la session épuisé sur la fenêtre glissante"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Grant:
+    """Slot accordé à une exécution: budget CPU restant de la session et limite mémoire"""
+
+    def __init__(self, session_id, cpu_budget, memory_limit_mb, queue_wait):
+        self.session_id = session_id
+        self.cpu_budget = cpu_budget
+        self.memory_limit_mb = memory_limit_mb
+        self.queue_wait = queue_wait
+        self.cpu_time = 0.0  # consommé, renseigné après l'exécution
+
+
+class ExecutionScheduler:
+    """File d'attente équitable entre sessions devant `max_concurrent` slots d'exécution"""
+
+    def __init__(self, max_concurrent=4, cpu_quota=120.0, quota_window=600.0, memory_quota_mb=1024):
+        self.max_concurrent = max_concurrent
+        self.cpu_quota = cpu_quota  # secondes CPU par session sur `quota_window` secondes
+        self.quota_window = quota_window
+        self.memory_quota_mb = memory_quota_mb  # croissance mémoire maximale d'une exécution
+        self._cond = threading.Condition()
+        self._waiting = {}  # session -> deque de tickets (ordre d'arrivée)
+        self._usage = {}  # session -> deque de (horodatage, secondes CPU)
+        self._last_served = {}
+        self._running = 0
+
+    def _used(self, session_id, now):
+        usage = self._usage.get(session_id)
+        if not usage:
+            return 0.0
+        while usage and now - usage[0][0] > self.quota_window:
+            usage.popleft()
+        if not usage:
+            del self._usage[session_id]
+            return 0.0
+        return sum(cpu for _, cpu in usage)
+
+    def _retry_after(self, session_id, now):
+        """Secondes avant que le CPU consommé repasse sous le quota"""
+        used = self._used(session_id, now)
+        for timestamp, cpu in self._usage.get(session_id, ()):
+            used -= cpu
+            if used < self.cpu_quota:
+                return max(1, round(self.quota_window - (now - timestamp)))
+        return 1
+
+    def _check_quota(self, session_id, now):
+        used = self._used(session_id, now)
+        if used >= self.cpu_quota:
+            retry_after = self._retry_after(session_id, now)
+            raise QuotaExceeded(
+                f"Quota CPU de la session épuisé ({used:.0f}s / {self.cpu_quota:g}s sur "
+                f"{self.quota_window / 60:g} min): réessayez dans {retry_after}s",
+                retry_after,
+            )
+        return self.cpu_quota - used
+
+    def _order(self, now):
+        """Sessions en attente: la moins consommatrice d'abord, puis la moins récemment servie"""
+        return sorted(self._waiting, key=lambda s: (self._used(s, now), self._last_served.get(s, 0.0)))
+
+    def _position(self, session_id, ticket, now):
+        """Rang estimé du ticket (1 = prochain servi), en supposant un tour par session"""
+        order = self._order(now)
+        rank = self._waiting[session_id].index(ticket)
+        session_rank = order.index(session_id)
+        ahead = rank
+        for other_rank, other in enumerate(order):
+            if other != session_id:
+                ahead += min(len(self._waiting[other]), rank + (other_rank < session_rank))
+        return ahead + 1
+
+    def _is_next(self, session_id, ticket, now):
+        return self._order(now)[0] == session_id and self._waiting[session_id][0] is ticket
+
+    def _remove(self, session_id, ticket):
+        waiting = self._waiting[session_id]
+        waiting.remove(ticket)
+        if not waiting:
+            del self._waiting[session_id]
+
+    @contextlib.contextmanager
+    def slot(self, session_id, on_queue=None):
+        """Attend un slot pour la session; lève QuotaExceeded si son quota CPU est épuisé.
+
+        `on_queue(position)` est appelé (sous verrou: doit être rapide) quand la position change.
+        """
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._check_quota(session_id, start)
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            last_position = None
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._running < self.max_concurrent and self._is_next(session_id, ticket, now):
+                        break
+                    position = self._position(session_id, ticket, now)
+                    if on_queue is not None and position != last_position:
+                        on_queue(position)
+                        last_position = position
+                    self._cond.wait(1.0)
+            finally:
+                self._remove(session_id, ticket)
+                self._cond.notify_all()
+
+            # Le quota a pu être consommé par une autre exécution de la session pendant l'attente
+            cpu_budget = self._check_quota(session_id, now)
+            self._running += 1
+            self._last_served[session_id] = now
+
+        grant = Grant(session_id, cpu_budget, self.memory_quota_mb, time.monotonic() - start)
+        try:
+            yield grant
+        finally:
+            with self._cond:
+                self._running -= 1
+                if grant.cpu_time:
+                    self._usage.setdefault(session_id, deque()).append((time.monotonic(), grant.cpu_time))
+                self._cond.notify_all()
+
+    def run(self, session_id, execute, cpu_timeout=None, on_queue=None):
+        """Exécute `execute(cpu_timeout, memory_limit_mb)` dans un slot et retourne son résultat.
+
+        Les dépassements de quota deviennent des résultats en erreur (`quota_exceeded`).
+        """
+        try:
+            with self.slot(session_id, on_queue) as grant:
+                limit = grant.cpu_budget if cpu_timeout is None else min(cpu_timeout, grant.cpu_budget)
+                result = execute(limit, grant.memory_limit_mb)
+                grant.cpu_time = result.get("cpu_time") or 0.0
+        except QuotaExceeded as e:
+            return {"success": False, "output": "", "error": str(e), "quota_exceeded": "cpu"}
+
+        result["queue_wait"] = round(grant.queue_wait, 3)
+        if result.get("cpu_exceeded") and (cpu_timeout is None or limit < cpu_timeout):
+            result["error"] = f"Quota CPU de la session atteint ({self.cpu_quota:g}s sur {self.quota_window / 60:g} min)"
+            result["quota_exceeded"] = "cpu"
+        elif result.get("memory_limit_exceeded"):
+            result["error"] = f"Quota mémoire dépassé ({grant.memory_limit_mb} Mo par exécution)"
+            result["quota_exceeded"] = "memory"
+        return result
+
+    def usage(self, session_id):
+        """CPU consommé par la session sur la fenêtre, et état global de la file"""
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "cpu_used": round(self._used(session_id, now), 1),
+                "cpu_quota": self.cpu_quota,
+                "running": self._running,
+                "queued": sum(len(waiting) for waiting in self._waiting.values()),
+            }
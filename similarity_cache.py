@@ -0,0 +1,214 @@
+"""
+Cache des requêtes similaires
+Index vectoriel local des prompts déjà traités, par mode: termes significatifs hachés, pondération TF-IDF
+et similarité cosinus en NumPy, sans appel réseau. Un prompt proche d'un prompt connu réutilise sa réponse
+(stockée dans le cache des réponses via sa clé).
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 4096  # buckets du hachage des termes (puissance de 2)
+
+# Mots vides et verbes de demande: "fais-moi une ..." et "crée un ..." demandent la même chose
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle en et est il ils j je l la le les leur lui m ma me
+mes moi mon n ne nous on ou par pas pour qu que qui s sa se ses son sur t ta te tes toi ton tu un une vos
+votre vous y c ca cela ceci quel quelle quels quelles comment stp svp merci bonjour salut peux pourrais
+veux voudrais aimerais besoin faut simple petit petite rapide rapidement moderne complet complete
+cree creer creez fais faire faites ecris ecrire ecrivez genere generer generez donne donner donnez
+montre montrer realise realiser developpe developper code coder programme programmer implemente
+implementer construis construire propose proposer aide aider
+the an and or of to in on for with me my i you your please can could would make create write build
+generate give show develop implement some simple quick
+""".split())
+
+# Variantes courantes ramenées à un même terme
+SYNONYMS = {
+    "html": "web", "site": "web", "webpage": "web", "page": "web", "navigateur": "web", "browser": "web",
+    "javascript": "js", "py": "python",
+    "application": "app", "appli": "app", "logiciel": "app",
+    "game": "jeu", "snake": "serpent", "calculator": "calculatrice", "calculette": "calculatrice",
+    "todo": "taches", "tache": "taches", "task": "taches", "tasks": "taches",
+    "graphique": "graph", "courbe": "graph", "plot": "graph", "chart": "graph", "diagramme": "graph",
+    "fichier": "file", "tableau": "table", "liste": "list",
+}
+SUFFIXES = ("ations", "ation", "ements", "ement", "euses", "euse", "eurs", "eur", "ees", "ee", "er", "ez",
+            "es", "e", "s", "x")
+
+
+def normalize_text(text):
+    """Minuscules, sans accents ni ponctuation"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def _stem(word):
+    """Racine grossière: "trie", "trier", "tries" -> "tri" (le pluriel et les formes verbales comptent peu)"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text):
+    """Termes significatifs: sans mots vides ni verbes de demande, synonymes et flexions ramenés à une forme"""
+    result = []
+    for word in normalize_text(text).replace("_", " ").split():
+        if word in STOPWORDS or word.isdigit():
+            continue
+        word = SYNONYMS.get(word) or SYNONYMS.get(word.rstrip("sx")) or _stem(word)
+        if word not in STOPWORDS:
+            result.append(word)
+    return result
+
+
+def vectorize(text, dimensions=DEFAULT_DIMENSIONS):
+    """Vecteur TF (log) des termes hachés; hachage stable d'un process à l'autre (crc32)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    mask = dimensions - 1
+    for term in terms(text):
+        vector[zlib.crc32(term.encode("utf-8")) & mask] += 1
+    np.log1p(vector, out=vector)
+    return vector
+
+
+class SimilarityIndex:
+    """Index borné des prompts d'un mode; évince le moins récemment utilisé quand il est plein"""
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, max_entries=500):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._entries = []  # par ligne: {"prompt", "cache_key", "last_used"}
+        self._document_frequency = np.zeros(dimensions, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _idf(self):
+        count = len(self._entries)
+        return np.log((1 + count) / (1 + self._document_frequency)) + 1
+
+    def add(self, prompt, cache_key, last_used=None):
+        """Ajoute (ou remplace) un prompt; retourne l'entrée évincée ou None"""
+        vector = vectorize(prompt, self.dimensions)
+        entry = {"prompt": prompt, "cache_key": cache_key, "last_used": last_used or time.time()}
+        evicted = None
+
+        row = next((i for i, e in enumerate(self._entries) if e["cache_key"] == cache_key), None)
+        if row is None and len(self._entries) >= self.max_entries:
+            row = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+            evicted = self._entries[row]
+        if row is None:
+            self._vectors = np.vstack([self._vectors, vector])
+            self._entries.append(entry)
+        else:
+            self._document_frequency -= self._vectors[row] > 0
+            self._vectors[row] = vector
+            self._entries[row] = entry
+        self._document_frequency += vector > 0
+        return evicted
+
+    def search(self, prompt, threshold):
+        """Entrée la plus proche si sa similarité cosinus atteint `threshold`: (score, entrée) ou None"""
+        if not self._entries:
+            return None
+        idf = self._idf()
+        query = vectorize(prompt, self.dimensions) * idf
+        query_norm = np.linalg.norm(query)
+        if not query_norm:
+            return None
+        weighted = self._vectors * idf
+        norms = np.linalg.norm(weighted, axis=1) * query_norm
+        scores = np.divide(weighted @ query, norms, out=np.zeros(len(self._entries), dtype=np.float32), where=norms > 0)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        entry = self._entries[best]
+        entry["last_used"] = time.time()
+        return float(scores[best]), entry
+
+
+class SimilarityCache:
+    """Un index par mode, persisté en SQLite (les vecteurs sont recalculés au démarrage)"""
+
+    def __init__(self, db_path, max_entries_per_mode=500, dimensions=DEFAULT_DIMENSIONS):
+        self.db_path = Path(db_path)
+        self.max_entries_per_mode = max_entries_per_mode
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(str(self.db_path), timeout=10, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS prompts (
+                mode TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (mode, cache_key)
+            )"""
+        )
+        self._conn.commit()
+
+        rows = self._conn.execute("SELECT mode, cache_key, prompt, last_used FROM prompts ORDER BY last_used").fetchall()
+        for mode, cache_key, prompt, last_used in rows:
+            evicted = self._index(mode).add(prompt, cache_key, last_used)
+            if evicted:
+                self._forget(mode, evicted)
+        self._conn.commit()
+
+    def _index(self, mode):
+        index = self._indexes.get(mode)
+        if index is None:
+            index = self._indexes[mode] = SimilarityIndex(self.dimensions, self.max_entries_per_mode)
+        return index
+
+    def _forget(self, mode, entry):
+        self._conn.execute("DELETE FROM prompts WHERE mode = ? AND cache_key = ?", (mode, entry["cache_key"]))
+
+    def add(self, mode, prompt, cache_key):
+        """Indexe un prompt dont la réponse est stockée sous `cache_key`"""
+        with self._lock, self._conn:
+            evicted = self._index(mode).add(prompt, cache_key)
+            if evicted:
+                self._forget(mode, evicted)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompts (mode, cache_key, prompt, last_used) VALUES (?, ?, ?, ?)",
+                (mode, cache_key, prompt, time.time()),
+            )
+
+    def lookup(self, mode, prompt, threshold):
+        """Prompt indexé le plus proche: {"prompt", "cache_key", "score"} ou None"""
+        with self._lock:
+            match = self._index(mode).search(prompt, threshold)
+            if match is None:
+                self.misses += 1
+                return None
+            score, entry = match
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE prompts SET last_used = ? WHERE mode = ? AND cache_key = ?",
+                    (entry["last_used"], mode, entry["cache_key"]),
+                )
+        return {"prompt": entry["prompt"], "cache_key": entry["cache_key"], "score": round(score, 3)}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": {mode: len(index) for mode, index in self._indexes.items()},
+            }
@@ -0,0 +1,247 @@
+"""
+Serveur local compatible OpenAI pour les benchmarks et les tests de charge
+Rejoue des réponses enregistrées ou synthétiques avec latence (TTFT) et débit (tokens/s) configurables
+
+Usage: python stub_server.py --port 8000 --ttft 0.3 --tokens-per-second 150
+puis LLM_BASE_URL=http://127.0.0.1:8000/v1 LLM_ENDPOINTS=stub HF_TOKEN=stub streamlit run app.py
+"""
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+CHAT_RESPONSE = """Voici une réponse détaillée.
+
+## Points clés
+- Le premier point explique le contexte général de la question.
+- Le deuxième point donne un exemple concret et immédiatement utilisable.
+- Le troisième point résume les compromis à garder en tête.
+
+En résumé, la solution recommandée est simple à mettre en place et facile à maintenir."""
+
+EXECUTION_RESPONSE = """Voici le code pour résoudre ce problème:
+
+```python
+valeurs = [math.sqrt(i) for i in range(1, 1001)]
+print(f"Somme: {sum(valeurs):.2f}")
+print(f"Moyenne: {sum(valeurs) / len(valeurs):.4f}")
+```
+
+Et une vérification rapide:
+
+```python
+total = 0
+for i in range(100000):
+    total += i * i
+print("Total:", total)
+```
+"""
+
+
+def project_response(file_count=8, file_size=1500):
+    files = [
+        {
+            "name": f"src/module_{i}.js" if i else "index.html",
+            "content": (f"// Fichier {i}\n" + "const valeur = 42; // commentaire explicatif\n" * (file_size // 45)),
+            "description": f"Fichier {i}",
+        }
+        for i in range(file_count)
+    ]
+    project = {
+        "name": "projet_stub",
+        "description": "Projet généré par le serveur de test",
+        "type": "web",
+        "files": files,
+        "installation": "Ouvrir index.html",
+        "usage": "Aucune dépendance",
+    }
+    return "Voici le projet demandé:\n\n```json\n" + json.dumps(project, ensure_ascii=False, indent=2) + "\n```\n"
+
+
+PROJECT_RESPONSE = project_response()
+
+
+def synthetic_response(messages):
+    """Réponse choisie d'après le prompt système de l'app (projet, code Python ou chat)"""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    if "FORMAT DE RÉPONSE pour projets" in system:
+        return PROJECT_RESPONSE
+    if "expert Python" in system:
+        return EXECUTION_RESPONSE
+    return CHAT_RESPONSE
+
+
+def load_recorded(path):
+    """Réponses enregistrées: JSONL de {"response": ...} (ou {"content": ...}), rejouées en boucle"""
+    responses = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                responses.append(record.get("response") or record.get("content") or "")
+    return responses
+
+
+class StubServer:
+    """Serveur HTTP en thread de fond; `base_url` à passer au client OpenAI"""
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.2, tokens_per_second=200.0,
+                 recorded=None, error_rate=0.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._recorded = itertools.cycle(recorded) if recorded else None
+        self._lock = threading.Lock()
+        self.requests = 0
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_request(self, messages):
+        """Numéro de la requête, réponse à rejouer et erreur simulée ou non"""
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+            response = next(self._recorded) if self._recorded else None
+        fail = self.error_rate and (number * self.error_rate) % 1 < self.error_rate
+        return response if response is not None else synthetic_response(messages), fail
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                messages = body.get("messages", [])
+                text, fail = stub._next_request(messages)
+                if fail:
+                    # Erreur transitoire: le client doit réessayer
+                    self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "0.1"})
+                    return
+
+                tokens = TOKEN_PATTERN.findall(text)
+                if body.get("max_tokens"):
+                    tokens = tokens[:body["max_tokens"]]
+                prompt_tokens = sum(len(TOKEN_PATTERN.findall(m.get("content") or "")) for m in messages)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                }
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                model = body.get("model", "stub")
+                delay = 1.0 / stub.tokens_per_second if stub.tokens_per_second else 0.0
+
+                time.sleep(stub.ttft)
+                if not body.get("stream"):
+                    time.sleep(delay * len(tokens))
+                    self._send_json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                     "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk(choices, **extra):
+                    return json.dumps({
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": choices, **extra,
+                    })
+
+                start = time.monotonic()
+                for i, token in enumerate(tokens):
+                    # Débit régulier, sans dérive liée au coût d'écriture
+                    wait = start + i * delay - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    self._send_event(chunk([{"index": 0, "delta": {"content": token}, "finish_reason": None}]))
+                self._send_event(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._send_event(chunk([], usage=usage))
+                self._send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local compatible OpenAI (réponses rejouées)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft", type=float, default=0.2, help="délai avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part de réponses 429")
+    parser.add_argument("--recorded", help="JSONL de réponses enregistrées à rejouer")
+    args = parser.parse_args()
+
+    recorded = load_recorded(args.recorded) if args.recorded else None
+    server = StubServer(args.host, args.port, args.ttft, args.tokens_per_second, recorded, args.error_rate)
+    server.start()
+    print(f"Serveur prêt: {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
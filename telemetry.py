@@ -0,0 +1,223 @@
+"""
+Métriques et traces des tours de chat
+Spans par étape (prompt, file d'attente, TTFT, génération, exécutions, projet, ZIP, stats),
+histogrammes au format Prometheus sur un endpoint local et traces JSON optionnelles
+"""
+
+import bisect
+import contextlib
+import datetime
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes (secondes): du rendu local (ms) à la génération complète (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [compteurs par borne, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, {"le": _format_value(float(bound))})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Trace:
+    """Spans d'un tour de chat; `finish()` les publie dans les histogrammes et le log JSON"""
+
+    def __init__(self, telemetry, mode):
+        self.telemetry = telemetry
+        self.trace_id = uuid.uuid4().hex
+        self.mode = mode
+        self.model = "unknown"
+        self.status = "ok"
+        self.attributes = {}
+        self.spans = []
+        self._start = time.perf_counter()
+        self._started_at = datetime.datetime.now().isoformat()
+        self._finished = False
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Chronomètre le bloc comme une étape du tour"""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self._add(name, start, time.perf_counter() - start, attributes)
+
+    def record(self, name, duration, **attributes):
+        """Ajoute une étape mesurée ailleurs (TTFT, file d'attente, exécution dans un worker)"""
+        if duration is not None:
+            self._add(name, None, duration, attributes)
+
+    def _add(self, name, start, duration, attributes):
+        self.spans.append({
+            "name": name,
+            "offset_ms": round((start - self._start) * 1000, 2) if start is not None else None,
+            "duration_ms": round(duration * 1000, 2),
+            **({"attributes": attributes} if attributes else {}),
+        })
+
+    def finish(self, status=None):
+        if self._finished:
+            return
+        self._finished = True
+        if status:
+            self.status = status
+        self.telemetry._publish(self, time.perf_counter() - self._start)
+
+    def to_dict(self, duration):
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self._started_at,
+            "mode": self.mode,
+            "model": self.model,
+            "status": self.status,
+            "duration_ms": round(duration * 1000, 2),
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }
+
+
+class Telemetry:
+    """Registre de métriques du process, endpoint /metrics et log de traces JSON"""
+
+    def __init__(self, trace_log=None):
+        self.trace_log = trace_log
+        self._log_lock = threading.Lock()
+        self._server = None
+        self.turn_duration = Histogram(
+            "assistant_turn_duration_seconds", "Durée totale d'un tour de chat", ("mode", "model")
+        )
+        self.stage_duration = Histogram(
+            "assistant_stage_duration_seconds", "Durée de chaque étape d'un tour", ("stage", "mode", "model")
+        )
+        self.turns = Counter("assistant_turns_total", "Tours de chat terminés", ("mode", "model", "status"))
+        self.tokens = Counter("assistant_tokens_total", "Tokens consommés", ("mode", "model", "direction"))
+        self._metrics = (self.turn_duration, self.stage_duration, self.turns, self.tokens)
+
+    def start_trace(self, mode):
+        return Trace(self, mode)
+
+    def _publish(self, trace, duration):
+        labels = {"mode": trace.mode, "model": trace.model}
+        self.turn_duration.observe(duration, **labels)
+        for span in trace.spans:
+            self.stage_duration.observe(span["duration_ms"] / 1000, stage=span["name"], **labels)
+        self.turns.inc(status=trace.status, **labels)
+        for direction in ("input", "output"):
+            tokens = trace.attributes.get(f"{direction}_tokens")
+            if tokens:
+                self.tokens.inc(tokens, direction=direction, **labels)
+
+        if self.trace_log:
+            line = json.dumps(trace.to_dict(duration), ensure_ascii=False, default=str)
+            with self._log_lock, open(self.trace_log, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def render(self):
+        """Métriques au format texte Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9464):
+        """Expose GET /metrics dans un thread de fond; retourne False si le port est pris"""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = telemetry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # Autre process Streamlit sur la même machine: pas d'endpoint pour celui-ci
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        return True
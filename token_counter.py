@@ -0,0 +1,105 @@
+"""
+Comptage des tokens
+Tokenizer BPE local (tiktoken) avec repli sur une estimation, résultats mémoïsés par texte
+
+Le fichier BPE n'est jamais téléchargé par l'app: le placer dans TOKENIZER_DIR avec
+`python token_counter.py` (une fois, au déploiement).
+"""
+
+import functools
+import hashlib
+import os
+import threading
+import urllib.request
+from pathlib import Path
+
+ENCODING_NAME = "o200k_base"  # encodage de la famille gpt-oss
+BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+BPE_SHA256 = "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d"
+# Cache de tiktoken: fichiers nommés par le sha1 de leur URL
+TOKENIZER_DIR = Path(os.environ.get("TIKTOKEN_CACHE_DIR") or Path(__file__).resolve().parent / "tokenizer")
+DOWNLOAD_TIMEOUT = 30  # secondes
+MESSAGE_OVERHEAD_TOKENS = 4  # tokens de formatage ajoutés par message du chat
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def bpe_path():
+    """Emplacement du fichier BPE dans le cache de tiktoken"""
+    return TOKENIZER_DIR / hashlib.sha1(BPE_URL.encode()).hexdigest()
+
+
+def _get_encoding():
+    """Charge l'encodage BPE local une seule fois (None si tiktoken ou le fichier BPE est absent)"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                _encoding = None
+                # Sans fichier local, tiktoken le téléchargerait (sans délai maximum) sous ce verrou
+                if bpe_path().exists():
+                    os.environ["TIKTOKEN_CACHE_DIR"] = str(TOKENIZER_DIR)
+                    try:
+                        import tiktoken
+                        _encoding = tiktoken.get_encoding(ENCODING_NAME)
+                    except Exception:
+                        _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_source():
+    """Origine des comptes locaux: "tokenizer" (BPE exact) ou "estimate" (repli sur les mots)"""
+    return "tokenizer" if _get_encoding() is not None else "estimate"
+
+
+def download_bpe(timeout=DOWNLOAD_TIMEOUT):
+    """Télécharge et vérifie le fichier BPE dans TOKENIZER_DIR, retourne son chemin"""
+    path = bpe_path()
+    with urllib.request.urlopen(BPE_URL, timeout=timeout) as response:
+        data = response.read()
+    if hashlib.sha256(data).hexdigest() != BPE_SHA256:
+        raise ValueError(f"Fichier BPE corrompu: {BPE_URL}")
+    TOKENIZER_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def estimate_tokens(text):
+    """Estimation grossière utilisée sans tokenizer"""
+    return int(len(text.split()) * 1.3)
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text):
+    """Nombre de tokens d'un texte (mémoïsé: l'historique n'est jamais recompté)"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages):
+    """Nombre de tokens d'une liste de messages du chat"""
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def usage_to_dict(usage):
+    """Convertit le `usage` renvoyé par l'API en dict (None si absent)"""
+    if usage is None or getattr(usage, "completion_tokens", None) is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = usage.completion_tokens
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": getattr(usage, "total_tokens", None) or prompt_tokens + completion_tokens,
+    }
+
+
+if __name__ == "__main__":
+    print(f"Fichier BPE {ENCODING_NAME}: {download_bpe()}")
@@ -0,0 +1,164 @@
+"""
+Registre d'utilisation (tokens, requêtes, projets)
+Une ligne ajoutée par requête dans SQLite (mode WAL) + agrégats maintenus dans la même transaction
+"""
+
+import datetime
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class UsageLedger:
+    """Registre append-only partagé par les sessions et les process (verrouillage SQLite)"""
+
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                model TEXT,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                cached INTEGER NOT NULL DEFAULT 0,
+                executions INTEGER NOT NULL DEFAULT 0,
+                projects INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                requests INTEGER NOT NULL DEFAULT 0,
+                projects INTEGER NOT NULL DEFAULT 0,
+                executions INTEGER NOT NULL DEFAULT 0
+            );
+            -- Agrégats: scope "total" (clé ''), "day" (YYYY-MM-DD) ou "mode"
+            CREATE TABLE IF NOT EXISTS rollups (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                requests INTEGER NOT NULL DEFAULT 0,
+                projects INTEGER NOT NULL DEFAULT 0,
+                executions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, key)
+            );
+            """
+        )
+        self._conn.commit()
+
+        if legacy_json is not None:
+            self._import_legacy(Path(legacy_json))
+
+    def _import_legacy(self, legacy_path):
+        """Reprend les totaux de l'ancien credits_usage.json (une seule fois, registre vide)"""
+        if not legacy_path.exists():
+            return
+        with self._lock:
+            if self._conn.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]:
+                return
+            try:
+                with open(legacy_path, 'r') as f:
+                    data = json.load(f)
+            except Exception:
+                return
+
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO rollups (scope, key, tokens, requests, projects, executions) VALUES ('total', '', ?, ?, ?, 0)",
+                    (data.get("total_tokens", 0), data.get("total_requests", 0), data.get("projects_created", 0)),
+                )
+                for session in data.get("sessions", []):
+                    self._conn.execute(
+                        "INSERT INTO sessions (timestamp, tokens, requests, projects, executions) VALUES (?, ?, ?, ?, ?)",
+                        (
+                            session.get("timestamp", ""),
+                            session.get("tokens", 0),
+                            session.get("requests", 0),
+                            session.get("projects", 0),
+                            session.get("executions", 0),
+                        ),
+                    )
+
+    def _bump_rollup(self, scope, key, tokens, requests, projects, executions):
+        self._conn.execute(
+            """INSERT INTO rollups (scope, key, tokens, requests, projects, executions)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(scope, key) DO UPDATE SET
+                   tokens = tokens + excluded.tokens,
+                   requests = requests + excluded.requests,
+                   projects = projects + excluded.projects,
+                   executions = executions + excluded.executions""",
+            (scope, key, tokens, requests, projects, executions),
+        )
+
+    def record_request(self, mode, tokens, input_tokens=0, output_tokens=0, model=None,
+                       cached=False, executions=0, projects=0):
+        """Ajoute une requête au registre et met à jour les agrégats"""
+        now = datetime.datetime.now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO requests
+                   (timestamp, mode, model, input_tokens, output_tokens, tokens, cached, executions, projects)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (now.isoformat(), mode, model, input_tokens, output_tokens, tokens, int(cached), executions, projects),
+            )
+            for scope, key in (("total", ""), ("day", now.date().isoformat()), ("mode", mode)):
+                self._bump_rollup(scope, key, tokens, 1, projects, executions)
+
+    def record_session(self, tokens, requests, projects, executions):
+        """Enregistre le bilan d'une session (au reset)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (timestamp, tokens, requests, projects, executions) VALUES (?, ?, ?, ?, ?)",
+                (datetime.datetime.now().isoformat(), tokens, requests, projects, executions),
+            )
+
+    def totals(self):
+        """Totaux globaux (lecture d'une seule ligne d'agrégat)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens, requests, projects, executions FROM rollups WHERE scope = 'total' AND key = ''"
+            ).fetchone()
+        tokens, requests, projects, executions = row or (0, 0, 0, 0)
+        return {
+            "total_tokens": tokens,
+            "total_requests": requests,
+            "projects_created": projects,
+            "code_executions": executions,
+        }
+
+    def rollups(self, scope, limit=None):
+        """Agrégats d'un scope ("day" ou "mode"), clés les plus récentes/grandes d'abord"""
+        order = "key DESC" if scope == "day" else "tokens DESC"
+        query = f"SELECT key, tokens, requests, projects, executions FROM rollups WHERE scope = ? ORDER BY {order}"
+        params = [scope]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {"key": key, "tokens": tokens, "requests": requests, "projects": projects, "executions": executions}
+            for key, tokens, requests, projects, executions in rows
+        ]
+
+    def recent_sessions(self, limit=5):
+        """Dernières sessions enregistrées, la plus récente d'abord"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT timestamp, tokens, requests, projects, executions FROM sessions ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {"timestamp": timestamp, "tokens": tokens, "requests": requests, "projects": projects, "executions": executions}
+            for timestamp, tokens, requests, projects, executions in rows
+        ]